@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+import csv
+import hashlib
+import os
+import pickle
+import re
+import unicodedata
+from functools import lru_cache
+from urllib.parse import urlparse
+
+from keyword_matcher import KeywordMatcher, normalize_text
+
+
+INDEX_VERSION = 1
+DEFAULT_CITY_CSV = "all-cities.csv"
+RESOLVE_CACHE_SIZE = 65536
+TAG_CACHE_SIZE = 65536
+# Shorter city names ("po", "ba") are ordinary words far more often than cities.
+MIN_CITY_NAME_LENGTH = 3
+# Letters NFKD does not decompose into an ASCII base letter.
+ASCII_FOLD = str.maketrans({"ı": "i", "ə": "e", "ø": "o", "æ": "ae", "đ": "d", "ł": "l", "þ": "th"})
+
+SLUG_PATTERN = re.compile(r"[^a-z0-9]+")
+# Matches the "countries/<country>" and "prayer-times-<city>" path segments in one pass.
+ROUTE_PATTERN = re.compile(
+    r"(?<![^/])(?:countries/+(?=(?P<country>[^/]+))|prayer-times-(?P<city>[^/]*))"
+)
+
+
+def normalize_slug(value):
+    if not value:
+        return ""
+    value = value.strip().lower()
+    value = SLUG_PATTERN.sub("-", value)
+    return value.strip("-")
+
+
+def resolve_city_csv_path(config):
+    city_cfg = config.get("city_mapping", {})
+    csv_file = city_cfg.get("csv_file", DEFAULT_CITY_CSV)
+
+    if os.path.isabs(csv_file):
+        return csv_file
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, csv_file)
+
+
+def resolve_city_index_path(config, csv_path):
+    city_cfg = config.get("city_mapping", {})
+    index_file = city_cfg.get("index_file")
+    if not index_file:
+        base, _ = os.path.splitext(csv_path)
+        return f"{base}.index.pickle"
+    if os.path.isabs(index_file):
+        return index_file
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, index_file)
+
+
+def resolve_city_matcher_path(config, csv_path):
+    city_cfg = config.get("city_mapping", {})
+    matcher_file = city_cfg.get("matcher_file")
+    if not matcher_file:
+        base, _ = os.path.splitext(csv_path)
+        return f"{base}.matcher.pickle"
+    if os.path.isabs(matcher_file):
+        return matcher_file
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, matcher_file)
+
+
+def extract_country_city_from_url(page_url):
+    if not page_url:
+        return "", ""
+
+    country_slug = None
+    city_slug = None
+    for match in ROUTE_PATTERN.finditer(urlparse(page_url).path):
+        if country_slug is None and match.group("country") is not None:
+            country_slug = normalize_slug(match.group("country"))
+        elif city_slug is None and match.group("city") is not None:
+            city_slug = normalize_slug(match.group("city"))
+        if country_slug is not None and city_slug is not None:
+            break
+
+    return country_slug or "", city_slug or ""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CityIndex:
+    def __init__(self, by_country_city=None, by_city=None, by_country=None):
+        self.by_country_city = by_country_city or {}
+        self.by_city = by_city or {}
+        self.by_country = by_country or {}
+        self.resolve = lru_cache(maxsize=RESOLVE_CACHE_SIZE)(self._resolve)
+
+    @classmethod
+    def build(cls, csv_path):
+        by_country_city = {}
+        by_city = {}
+        by_country = {}
+
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                city_id = str(row.get("id", "")).strip()
+                country = str(row.get("country", "")).strip()
+                city = str(row.get("city", "")).strip()
+
+                country_slug = normalize_slug(country)
+                if country_slug and country_slug not in by_country:
+                    by_country[country_slug] = country
+                if not city:
+                    continue
+
+                city_slug = normalize_slug(city)
+                payload = {"id": city_id, "country": country, "city": city}
+
+                by_country_city[(country_slug, city_slug)] = payload
+                by_city.setdefault(city_slug, []).append(payload)
+
+        return cls(by_country_city, by_city, by_country)
+
+    def to_payload(self):
+        return {
+            "by_country_city": self.by_country_city,
+            "by_city": self.by_city,
+            "by_country": self.by_country,
+        }
+
+    def _resolve(self, page_url):
+        country_slug, city_slug = extract_country_city_from_url(page_url)
+        resolved_country = (
+            self.by_country.get(country_slug, country_slug.replace("-", " "))
+            if country_slug
+            else ""
+        )
+
+        if not city_slug:
+            return {"id": "", "country": resolved_country, "city": ""}
+
+        matched = self.by_country_city.get((country_slug, city_slug))
+        if matched:
+            return matched
+
+        fallback = self.by_city.get(city_slug, [])
+        if len(fallback) == 1:
+            return fallback[0]
+
+        return {"id": "", "country": resolved_country, "city": ""}
+
+
+def city_name_variants(city):
+    name = normalize_text(city).strip()
+    slug = normalize_slug(city)
+    folded = "".join(
+        ch for ch in unicodedata.normalize("NFKD", name) if not unicodedata.combining(ch)
+    ).translate(ASCII_FOLD)
+    variants = {name, name.replace("-", " "), slug, slug.replace("-", " "), folded, folded.replace("-", " ")}
+    return [variant for variant in variants if len(variant) >= MIN_CITY_NAME_LENGTH]
+
+
+class CityMatcher:
+    # Whole-word Aho-Corasick matcher over every city name and slug variant, so
+    # a query is tagged with all the cities it mentions in one pass.
+
+    def __init__(self, matcher, cities_by_keyword, ignore=()):
+        self.matcher = matcher
+        self.cities_by_keyword = cities_by_keyword
+        self.ignore = {normalize_text(word).strip() for word in ignore}
+        self.tag = lru_cache(maxsize=TAG_CACHE_SIZE)(self._tag)
+
+    @classmethod
+    def build(cls, csv_path):
+        cities_by_keyword = {}
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                city = str(row.get("city", "")).strip()
+                if not city:
+                    continue
+                payload = {
+                    "id": str(row.get("id", "")).strip(),
+                    "country": str(row.get("country", "")).strip(),
+                    "city": city,
+                }
+                for variant in city_name_variants(city):
+                    cities_by_keyword.setdefault(variant, []).append(payload)
+
+        return cls(KeywordMatcher(cities_by_keyword, whole_words=True), cities_by_keyword)
+
+    def to_payload(self):
+        return {"matcher": self.matcher, "cities_by_keyword": self.cities_by_keyword}
+
+    def _tag(self, query):
+        # Overlapping names resolve leftmost-longest, so "san jose" does not also
+        # tag San; keywords spanning the same text all count.
+        spans = sorted(
+            (span for span in self.matcher.find_spans(query) if span[2] not in self.ignore),
+            key=lambda span: (span[0], span[0] - span[1]),
+        )
+        cities = {}
+        accepted = None
+        for start, end, keyword in spans:
+            if accepted is not None and start < accepted[1] and (start, end) != accepted:
+                continue
+            accepted = (start, end)
+            for payload in self.cities_by_keyword.get(keyword, []):
+                cities.setdefault(payload["id"] or payload["city"], payload)
+        return tuple(cities.values())
+
+
+def _read_index_file(index_path):
+    try:
+        with open(index_path, "rb") as f:
+            data = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+        return None
+    return data
+
+
+def _write_index_file(index_path, data):
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, index_path)
+    except OSError as exc:
+        print(f"[WARNING] Could not write city index {index_path}: {exc}")
+
+
+def _load_cached(csv_path, cache_path, build):
+    # The cache is reused while the CSV's mtime and size match, or when only the
+    # mtime changed but the content hash is the same.
+    stat = os.stat(csv_path)
+    data = _read_index_file(cache_path)
+
+    if data is not None:
+        source = data.get("source", {})
+        if source.get("mtime") == stat.st_mtime and source.get("size") == stat.st_size:
+            return data["index"]
+
+        if source.get("size") == stat.st_size and source.get("sha256") == file_sha256(csv_path):
+            data["source"]["mtime"] = stat.st_mtime
+            _write_index_file(cache_path, data)
+            return data["index"]
+
+    payload = build(csv_path).to_payload()
+    _write_index_file(
+        cache_path,
+        {
+            "version": INDEX_VERSION,
+            "source": {
+                "path": csv_path,
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "sha256": file_sha256(csv_path),
+            },
+            "index": payload,
+        },
+    )
+    return payload
+
+
+def load_city_index(config):
+    csv_path = resolve_city_csv_path(config)
+    if not os.path.exists(csv_path):
+        return None
+
+    index_path = resolve_city_index_path(config, csv_path)
+    return CityIndex(**_load_cached(csv_path, index_path, CityIndex.build))
+
+
+def load_city_matcher(config):
+    csv_path = resolve_city_csv_path(config)
+    if not os.path.exists(csv_path):
+        return None
+
+    matcher_path = resolve_city_matcher_path(config, csv_path)
+    ignore = config.get("city_mapping", {}).get("tag_ignore") or []
+    return CityMatcher(**_load_cached(csv_path, matcher_path, CityMatcher.build), ignore=ignore)
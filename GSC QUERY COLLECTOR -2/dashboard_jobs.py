@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+import contextvars
+import json
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+MAX_FINISHED_JOBS = 50
+FINISHED_STATES = {"succeeded", "failed"}
+EVENT_INTERVAL_SECONDS = 0.5
+KEEPALIVE_SECONDS = 15
+
+_current_log = contextvars.ContextVar("job_log", default=None)
+
+
+class _RoutedStream:
+    # Stands in for sys.stdout: text printed while a job runs (including from the
+    # collector's worker threads, which inherit the job's context) goes to that
+    # job's log, everything else to the real stream.
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, text):
+        log = _current_log.get()
+        if log is None:
+            return self._stream.write(text)
+        log.write(text)
+        return len(text)
+
+    def flush(self):
+        if _current_log.get() is None:
+            self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def install_stdout_router():
+    if not isinstance(sys.stdout, _RoutedStream):
+        sys.stdout = _RoutedStream(sys.stdout)
+
+
+class JobLog:
+    def __init__(self):
+        self._chunks = []
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            self._chunks.append(text)
+
+    def text(self):
+        with self._lock:
+            return "".join(self._chunks)
+
+    def read_since(self, cursor):
+        # cursor is a chunk count, so readers only ever see whole writes.
+        with self._lock:
+            return "".join(self._chunks[cursor:]), len(self._chunks)
+
+
+class Job:
+    def __init__(self, kind, fn, key=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.fn = fn
+        self.key = key
+        self.status = "queued"
+        self.queue_position = None
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.log = JobLog()
+        # Any object with a snapshot() method, e.g. gsc_data_collector.ProgressTracker.
+        self.progress = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def set_stage(self, stage):
+        self.stage = stage
+
+    def to_dict(self, include_log=False):
+        finished = self.finished_at or time.time()
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "queue_position": self.queue_position,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(finished - self.started_at, 1) if self.started_at else None,
+            "progress": self.progress.snapshot() if self.progress is not None else None,
+        }
+        if include_log:
+            data["log"] = self.log.text()
+        return data
+
+
+class JobManager:
+    # Runs at most max_workers jobs at once on a background thread pool; the rest
+    # wait in FIFO order. fn(job) returns the job result and reports its progress
+    # through job.set_stage and print(). A job submitted with the key of a queued
+    # or running job is coalesced into that job instead of running twice.
+
+    def __init__(self, max_workers=1):
+        install_stdout_router()
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline-job")
+        self._jobs = {}
+        self._active = {}
+        self._queue = deque()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, key=None):
+        # Returns (job, attached); attached is True when an identical job was
+        # already queued or running.
+        with self._lock:
+            if key is not None and key in self._active:
+                return self._active[key], True
+            job = Job(kind, fn, key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._active[key] = job
+            self._queue.append(job)
+            self._renumber_queue()
+            self._prune()
+            self._pool.submit(contextvars.Context().run, self._run, job)
+        return job, False
+
+    def _renumber_queue(self):
+        for position, queued in enumerate(self._queue, start=1):
+            queued.queue_position = position
+
+    def _run(self, job):
+        _current_log.set(job.log)
+        with self._lock:
+            self._queue.remove(job)
+            job.queue_position = None
+            self._renumber_queue()
+            job.status = "running"
+            job.started_at = time.time()
+        try:
+            job.result = job.fn(job)
+        except Exception as exc:
+            job.error = str(exc) or exc.__class__.__name__
+            job.log.write(traceback.format_exc())
+            job.status = "failed"
+        else:
+            job.status = "succeeded"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if job.key is not None and self._active.get(job.key) is job:
+                    del self._active[job.key]
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.status in FINISHED_STATES]
+        for job in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_length(self):
+        with self._lock:
+            return len(self._queue)
+
+    def list(self):
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def iter_job_events(job, interval=EVENT_INTERVAL_SECONDS):
+    # Server-sent events for one job: "status" and "progress" whenever they
+    # change, "log" with newly printed text, and a final "done" with the job.
+    cursor = 0
+    last_status = None
+    last_progress = None
+    last_sent = time.monotonic()
+    while True:
+        finished = job.status in FINISHED_STATES
+        events = []
+
+        status = (job.status, job.stage, job.queue_position)
+        if status != last_status:
+            events.append(
+                format_event(
+                    "status",
+                    {"status": job.status, "stage": job.stage, "queue_position": job.queue_position},
+                )
+            )
+            last_status = status
+
+        if job.progress is not None:
+            progress = job.progress.snapshot()
+            changed = {
+                key: value
+                for key, value in progress.items()
+                if key not in {"elapsed_seconds", "eta_seconds"}
+            }
+            if changed != last_progress:
+                events.append(format_event("progress", progress))
+                last_progress = changed
+
+        text, cursor = job.log.read_since(cursor)
+        if text:
+            events.append(format_event("log", {"text": text}))
+
+        if finished:
+            events.append(format_event("done", job.to_dict()))
+            yield "".join(events)
+            return
+
+        if events:
+            last_sent = time.monotonic()
+            yield "".join(events)
+        elif time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+            last_sent = time.monotonic()
+            yield ": keepalive\n\n"
+        time.sleep(interval)
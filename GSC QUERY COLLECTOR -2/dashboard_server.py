@@ -1,19 +1,39 @@
 #!/usr/bin/env python3
 
-import csv
-import subprocess
-import sys
-import re
+import time
 from pathlib import Path
 
-from flask import Flask, jsonify, request, send_file, send_from_directory
+from flask import Flask, Response, jsonify, request, send_file, send_from_directory, stream_with_context
 import yaml
 
+from dashboard_jobs import JobManager, iter_job_events
+from gsc_cache import is_final_date_range
+from city_index import resolve_city_csv_path
+from output_sinks import build_output_filename, get_output_files, get_output_format, get_output_layout
+from preview_index import METRIC_COLUMNS, get_preview_index
+from stage_cache import StageCache, config_hash, file_signature, stage_key
+
 
 BASE_DIR = Path(__file__).resolve().parent
 CONFIG_PATH = BASE_DIR / "config.yaml"
+# Runs share the API quota and the final output file, so by default they run one
+# at a time and later ones wait in a FIFO queue.
+PIPELINE_WORKERS = 1
+STAGE_CACHE_PATH = BASE_DIR / "pipeline_stages.json"
+# Settings that do not change what the collector writes.
+COLLECTOR_IGNORED_KEYS = (
+    "credentials_file",
+    "concurrency",
+    "retry",
+    "planner",
+    "final_format",
+    "batch",
+    "stage_cache",
+)
 
 app = Flask(__name__, static_folder=None)
+jobs = JobManager(max_workers=PIPELINE_WORKERS)
+stage_cache = StageCache(STAGE_CACHE_PATH)
 
 
 @app.route("/")
@@ -52,6 +72,15 @@ def _as_int(value, default=0):
         return default
 
 
+def _as_number(value, default=0):
+    # Float settings keep their fraction but are written without a trailing .0.
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return int(value) if value.is_integer() else value
+
+
 def _normalize_mode(value):
     mode = str(value or "query_wise").strip().lower()
     return mode if mode in {"query_wise", "page_wise"} else "query_wise"
@@ -68,7 +97,14 @@ def _build_final_input_csv(config_data):
     sort_by = str(sorting_cfg.get("sort_by") or "clicks").strip() or "clicks"
     days = _as_int(date_cfg.get("days"), 7)
 
-    return f"{output_directory}/{prefix}_{extraction_mode}_{sort_by}_{days}days.csv"
+    layout = get_output_layout(config_data) if extraction_mode == "page_wise" else "flat"
+    filename = build_output_filename(
+        f"{prefix}_{extraction_mode}_{sort_by}_{days}days",
+        get_output_format(config_data),
+        layout,
+    )
+
+    return f"{output_directory}/{filename}"
 
 
 def _sync_final_format_paths(config_data):
@@ -107,6 +143,11 @@ def _format_config_yaml(config_data):
         "prayer, namaz, salat, magrib, salah, esha, isha, solat",
     )
 
+    regex_pushdown = _as_bool(_nested_get(config_data, ["query_regex", "pushdown"], True), True)
+    regex_report_matches = _as_bool(
+        _nested_get(config_data, ["query_regex", "report_matches"], False), False
+    )
+
     sort_by = _nested_get(config_data, ["sorting", "sort_by"], "clicks")
     order = _nested_get(config_data, ["sorting", "order"], "descending")
 
@@ -114,6 +155,39 @@ def _format_config_yaml(config_data):
     delay_days = _as_int(_nested_get(config_data, ["date_range", "delay_days"], 0), 0)
 
     row_limit = _as_int(_nested_get(config_data, ["api", "row_limit"], 25000), 25000)
+    fetch_strategy = _nested_get(config_data, ["api", "fetch_strategy"], "per_request")
+    shard_days = _as_int(_nested_get(config_data, ["api", "shard_days"], 0), 0)
+    cross_language_sweep = _as_bool(
+        _nested_get(config_data, ["api", "cross_language_sweep"], False), False
+    )
+
+    workers = _as_int(_nested_get(config_data, ["concurrency", "workers"], 4), 4)
+    requests_per_second = _nested_get(config_data, ["concurrency", "requests_per_second"], 10)
+    requests_per_minute = _as_int(
+        _nested_get(config_data, ["concurrency", "requests_per_minute"], 1200),
+        1200,
+    )
+    min_workers = _as_int(_nested_get(config_data, ["concurrency", "min_workers"], 1), 1)
+    parallel_languages = _as_bool(
+        _nested_get(config_data, ["concurrency", "parallel_languages"], True),
+        True,
+    )
+    max_retries = _as_int(_nested_get(config_data, ["retry", "max_retries"], 5), 5)
+    base_delay_seconds = _nested_get(config_data, ["retry", "base_delay_seconds"], 1)
+    max_delay_seconds = _nested_get(config_data, ["retry", "max_delay_seconds"], 60)
+
+    cache_enabled = _as_bool(_nested_get(config_data, ["cache", "enabled"], True), True)
+    cache_directory = _nested_get(config_data, ["cache", "directory"], ".gsc_cache")
+    cache_max_size_mb = _as_int(_nested_get(config_data, ["cache", "max_size_mb"], 512), 512)
+    cache_final_after_days = _as_int(_nested_get(config_data, ["cache", "final_after_days"], 3), 3)
+    cache_ttl_hours = _as_number(_nested_get(config_data, ["cache", "ttl_hours"], 6), 6)
+    stage_cache_enabled = _as_bool(_nested_get(config_data, ["stage_cache", "enabled"], True), True)
+
+    warehouse_path = _nested_get(config_data, ["warehouse", "path"], "gsc_warehouse.sqlite3")
+    warehouse_final_after_days = _as_int(
+        _nested_get(config_data, ["warehouse", "final_after_days"], 3),
+        3,
+    )
 
     range_enabled = _as_bool(_nested_get(config_data, ["range_filter", "enabled"], False))
     start_row = _as_int(_nested_get(config_data, ["range_filter", "start_row"], 1), 1)
@@ -135,6 +209,15 @@ def _format_config_yaml(config_data):
     min_impressions = _nested_get(config_data, ["min_filter", "impressions"], None)
     min_clicks = _nested_get(config_data, ["min_filter", "clicks"], 1)
 
+    city_csv_file = _nested_get(config_data, ["city_mapping", "csv_file"], "all-cities.csv")
+    city_index_file = _nested_get(config_data, ["city_mapping", "index_file"])
+    city_matcher_file = _nested_get(config_data, ["city_mapping", "matcher_file"])
+    tag_queries = _as_bool(_nested_get(config_data, ["city_mapping", "tag_queries"], False), False)
+    tag_ignore = _nested_get(config_data, ["city_mapping", "tag_ignore"], ["time"])
+    if not isinstance(tag_ignore, list):
+        tag_ignore = [str(tag_ignore)]
+    tag_ignore = [str(item).strip() for item in tag_ignore if str(item).strip()]
+
     output_directory = _nested_get(config_data, ["output", "output_directory"], "output")
     prefix = _nested_get(config_data, ["output", "prefix"], "top_kws")
     include_timestamp = _as_bool(
@@ -145,6 +228,13 @@ def _format_config_yaml(config_data):
     )
     csv_delimiter = _nested_get(config_data, ["output", "csv_delimiter"], ",")
     csv_encoding = _nested_get(config_data, ["output", "csv_encoding"], "utf-8")
+    flush_every = _as_int(_nested_get(config_data, ["output", "flush_every"], 100), 100)
+    output_format = get_output_format(config_data)
+    output_layout = get_output_layout(config_data)
+    parquet_row_group_size = _as_int(
+        _nested_get(config_data, ["output", "parquet_row_group_size"], 50000), 50000
+    )
+    parquet_compression = _nested_get(config_data, ["output", "parquet_compression"], "zstd")
 
     input_csv = _nested_get(
         config_data,
@@ -152,6 +242,21 @@ def _format_config_yaml(config_data):
         "output/top_kws_query_wise_clicks_7days.csv",
     )
     output_csv = _nested_get(config_data, ["final_format", "output_csv"], "output/Input Data.csv")
+    planner_max_requests = _as_int(_nested_get(config_data, ["planner", "max_requests"], 0), 0)
+    planner_on_exceed = _nested_get(config_data, ["planner", "on_exceed"], "warn")
+    planner_assumed_list_rows = _as_int(
+        _nested_get(config_data, ["planner", "assumed_list_rows"], 200), 200
+    )
+    planner_assumed_sweep_rows = _as_int(
+        _nested_get(config_data, ["planner", "assumed_sweep_rows"], 50000), 50000
+    )
+    budget_enabled = _as_bool(_nested_get(config_data, ["budget", "enabled"], False))
+    budget_max_requests = _as_int(_nested_get(config_data, ["budget", "max_requests"], 0), 0)
+    budget_deadline_seconds = _as_number(_nested_get(config_data, ["budget", "deadline_seconds"], 0), 0)
+    budget_priority = _nested_get(config_data, ["budget", "priority"], "clicks")
+    batch_properties = _nested_get(config_data, ["batch", "properties"], [])
+    if not isinstance(batch_properties, list):
+        batch_properties = []
 
     lines = [
         "# Basic configuration and target settings",
@@ -169,6 +274,7 @@ def _format_config_yaml(config_data):
 
     min_impressions_text = "null" if min_impressions is None else str(min_impressions)
     min_clicks_text = "null" if min_clicks is None else str(min_clicks)
+    requests_per_second_text = "null" if requests_per_second is None else str(requests_per_second)
 
     lines.extend(
         [
@@ -178,6 +284,8 @@ def _format_config_yaml(config_data):
             "query_regex:",
             f"  enabled: {str(regex_enabled).lower()}",
             f"  patterns: {regex_patterns}",
+            f"  pushdown: {str(regex_pushdown).lower()}",
+            f"  report_matches: {str(regex_report_matches).lower()}",
             "",
             "# Data sorting preferences",
             "sorting:",
@@ -192,6 +300,40 @@ def _format_config_yaml(config_data):
             "# API limits and parameters",
             "api:",
             f"  row_limit: {row_limit}",
+            f"  fetch_strategy: {fetch_strategy}",
+            f"  shard_days: {shard_days}",
+            f"  cross_language_sweep: {str(cross_language_sweep).lower()}",
+            "",
+            "# Concurrent request settings",
+            "concurrency:",
+            f"  workers: {workers}",
+            f"  requests_per_second: {requests_per_second_text}",
+            f"  requests_per_minute: {requests_per_minute}",
+            f"  min_workers: {min_workers}",
+            f"  parallel_languages: {str(parallel_languages).lower()}",
+            "",
+            "# Retry with jittered exponential backoff on 429/5xx",
+            "retry:",
+            f"  max_retries: {max_retries}",
+            f"  base_delay_seconds: {base_delay_seconds}",
+            f"  max_delay_seconds: {max_delay_seconds}",
+            "",
+            "# On-disk response cache (dates older than final_after_days never expire)",
+            "cache:",
+            f"  enabled: {str(cache_enabled).lower()}",
+            f"  directory: {cache_directory}",
+            f"  max_size_mb: {cache_max_size_mb}",
+            f"  final_after_days: {cache_final_after_days}",
+            f"  ttl_hours: {cache_ttl_hours}",
+            "",
+            "# Dashboard runs skip pipeline stages whose inputs are unchanged",
+            "stage_cache:",
+            f"  enabled: {str(stage_cache_enabled).lower()}",
+            "",
+            "# Local per-day store used by api.fetch_strategy: warehouse",
+            "warehouse:",
+            f"  path: {warehouse_path}",
+            f"  final_after_days: {warehouse_final_after_days}",
             "",
             "# Row range limit settings",
             "range_filter:",
@@ -210,6 +352,15 @@ def _format_config_yaml(config_data):
             f"  impressions: {min_impressions_text}",
             f"  clicks: {min_clicks_text}",
             "",
+            "# City lookup for pages and query tagging",
+            "city_mapping:",
+            f"  csv_file: {city_csv_file}",
+            *([f"  index_file: {city_index_file}"] if city_index_file else []),
+            *([f"  matcher_file: {city_matcher_file}"] if city_matcher_file else []),
+            f"  tag_queries: {str(tag_queries).lower()}",
+            f"  tag_ignore:{'' if tag_ignore else ' []'}",
+            *[f"    - {word}" for word in tag_ignore],
+            "",
             "# Output directory and CSV formatting settings",
             "output:",
             f"  output_directory: {output_directory}",
@@ -218,12 +369,38 @@ def _format_config_yaml(config_data):
             f"  separate_by_language: {str(separate_by_language).lower()}",
             f"  csv_delimiter: \"{csv_delimiter}\"",
             f"  csv_encoding: {csv_encoding}",
+            f"  flush_every: {flush_every}",
+            f"  format: {output_format}",
+            f"  layout: {output_layout}",
+            f"  parquet_row_group_size: {parquet_row_group_size}",
+            f"  parquet_compression: {parquet_compression}",
             "",
             "# Input and output paths for final processing",
             "final_format:",
             f"  input_csv: {input_csv}",
             f"  output_csv: {output_csv}",
             "",
+            "# Request estimate and budget (python gsc_data_collector.py --dry-run)",
+            "planner:",
+            f"  max_requests: {planner_max_requests}",
+            f"  on_exceed: {planner_on_exceed}",
+            f"  assumed_list_rows: {planner_assumed_list_rows}",
+            f"  assumed_sweep_rows: {planner_assumed_sweep_rows}",
+            "",
+            "# Anytime collection: spend a limited quota on the highest-value pages first",
+            "budget:",
+            f"  enabled: {str(budget_enabled).lower()}",
+            f"  max_requests: {budget_max_requests}",
+            f"  deadline_seconds: {budget_deadline_seconds}",
+            f"  priority: {budget_priority}",
+            "",
+            "# Extra properties collected by: python gsc_data_collector.py --batch",
+            yaml.safe_dump(
+                {"batch": {"properties": batch_properties}},
+                sort_keys=False,
+                allow_unicode=True,
+            ).rstrip("\n"),
+            "",
         ]
     )
 
@@ -237,38 +414,6 @@ def save_config(config_data):
         handle.write(formatted)
 
 
-def run_python_script(script_name, args=None):
-    script_path = BASE_DIR / script_name
-    if not script_path.exists():
-        return {
-            "ok": False,
-            "message": f"Script not found: {script_name}",
-            "stdout": "",
-            "stderr": "",
-            "code": -1,
-        }
-
-    command = [sys.executable, str(script_path)]
-    if args:
-        command.extend([str(item) for item in args])
-
-    result = subprocess.run(
-        command,
-        cwd=str(BASE_DIR),
-        capture_output=True,
-        text=True,
-        encoding="utf-8",
-        errors="replace",
-    )
-    return {
-        "ok": result.returncode == 0,
-        "message": "ok" if result.returncode == 0 else "failed",
-        "stdout": result.stdout,
-        "stderr": result.stderr,
-        "code": result.returncode,
-    }
-
-
 def resolve_output_path(config_data, requested_path):
     path_value = requested_path or config_data.get("final_format", {}).get("output_csv", "")
     if not path_value:
@@ -291,46 +436,6 @@ def resolve_input_path(config_data):
     return input_path
 
 
-def load_preview_rows(csv_path, row_limit=1000):
-    rows = []
-    with csv_path.open("r", encoding="utf-8", newline="") as handle:
-        reader = csv.DictReader(handle)
-        for index, row in enumerate(reader, start=1):
-            if index > row_limit:
-                break
-            rows.append(
-                {
-                    "query": (row.get("query") or "").strip(),
-                    "page": (row.get("source_page") or row.get("page") or "").strip(),
-                    "language": (row.get("language") or "").strip(),
-                    "clicks": row.get("clicks", ""),
-                    "impressions": row.get("impressions", ""),
-                    "ctr": row.get("ctr", ""),
-                    "position": row.get("position", ""),
-                }
-            )
-    return rows
-
-
-def parse_collector_output_path(stdout_text):
-    if not stdout_text:
-        return None
-
-    match = re.search(r"^Output file\s*:\s*(.+)$", stdout_text, re.MULTILINE)
-    if not match:
-        return None
-
-    raw_path = match.group(1).strip()
-    if not raw_path:
-        return None
-
-    output_path = Path(raw_path)
-    if not output_path.is_absolute():
-        output_path = (BASE_DIR / output_path).resolve()
-
-    return output_path
-
-
 @app.get("/")
 def index():
     return send_from_directory(str(BASE_DIR), "dashboard.html")
@@ -351,6 +456,93 @@ def api_save_config():
     return jsonify({"message": "saved"})
 
 
+def collector_stage_inputs(config_data, date_range):
+    inputs = {key: value for key, value in config_data.items() if key not in COLLECTOR_IGNORED_KEYS}
+    # Relative date ranges move every day, so the resolved window is part of the key.
+    inputs["resolved_date_range"] = list(date_range)
+    inputs["city_csv"] = file_signature(resolve_city_csv_path(config_data))
+    return inputs
+
+
+def collector_stage_max_age(config_data, date_range):
+    # Same rule as the response cache: a collection ending before
+    # final_after_days never goes stale, a newer one expires after ttl_hours.
+    cache_cfg = config_data.get("cache") or {}
+    final_after_days = int(cache_cfg.get("final_after_days", 3))
+    if is_final_date_range({"endDate": date_range[1]}, final_after_days):
+        return None
+    ttl_hours = cache_cfg.get("ttl_hours", 6)
+    return float(ttl_hours if ttl_hours is not None else 6) * 3600
+
+
+def formatter_stage_inputs(config_data, collector_artifacts, output_path):
+    return {
+        "extraction_mode": config_data.get("extraction_mode"),
+        "city_mapping": config_data.get("city_mapping"),
+        "city_csv": file_signature(resolve_city_csv_path(config_data)),
+        "input": collector_artifacts,
+        "output": str(output_path) if output_path is not None else None,
+    }
+
+
+def run_pipeline(job, config_data, force=False):
+    # Imported lazily so the dashboard still starts without the Google client libraries.
+    from final_format import format_output
+    from gsc_data_collector import ProgressTracker, collect, get_date_range
+
+    credentials_file = config_data.get("credentials_file")
+    if credentials_file and not Path(credentials_file).is_absolute():
+        config_data["credentials_file"] = str(BASE_DIR / credentials_file)
+
+    stages = []
+    # With stage_cache.enabled false every run collects and formats afresh.
+    use_cache = not force and _as_bool(_nested_get(config_data, ["stage_cache", "enabled"], True), True)
+
+    job.set_stage("collector")
+    date_range = get_date_range(config_data)
+    collector_key = stage_key("collector", collector_stage_inputs(config_data, date_range))
+    entry = None
+    if use_cache:
+        entry = stage_cache.lookup(
+            "collector", collector_key, max_age_seconds=collector_stage_max_age(config_data, date_range)
+        )
+    stages.append({"stage": "collector", "cache_hit": entry is not None})
+    if entry is not None:
+        collector = entry["result"]
+        print(f"[cache] collector inputs unchanged, reusing {collector['output_file']}")
+    else:
+        job.progress = ProgressTracker()
+        collector = collect(config_data, progress=job.progress)
+        entry = stage_cache.store(
+            "collector", collector_key, get_output_files(collector["output_file"]), collector
+        )
+
+    job.set_stage("formatter")
+    output_path = resolve_output_path(config_data, None)
+    formatter_key = stage_key(
+        "formatter", formatter_stage_inputs(config_data, entry["artifacts"], output_path)
+    )
+    entry = stage_cache.lookup("formatter", formatter_key) if use_cache else None
+    stages.append({"stage": "formatter", "cache_hit": entry is not None})
+    if entry is not None:
+        formatter = entry["result"]
+        print(f"[cache] formatter inputs unchanged, reusing {formatter['output_file']}")
+    else:
+        formatted = format_output(
+            config_data,
+            collector["output_file"],
+            str(output_path) if output_path is not None else None,
+        )
+        formatter = {"output_file": str(formatted)}
+        stage_cache.store("formatter", formatter_key, [formatted], formatter)
+
+    return {
+        "collector": collector,
+        "formatter": formatter,
+        "stages": stages,
+    }
+
+
 @app.post("/api/run")
 def api_run_pipeline():
     payload = request.get_json(silent=True) or {}
@@ -358,50 +550,77 @@ def api_run_pipeline():
     if isinstance(posted_config, dict):
         save_config(posted_config)
 
-    collector = run_python_script("gsc_data_collector.py")
-    if not collector["ok"]:
-        return (
-            jsonify(
-                {
-                    "message": "gsc_data_collector.py failed",
-                    "stage": "collector",
-                    "details": collector,
-                }
-            ),
-            500,
-        )
+    config_data = load_config()
+    force = bool(payload.get("force"))
+    job, attached = jobs.submit(
+        "pipeline",
+        lambda job: run_pipeline(job, config_data, force=force),
+        key=config_hash({"config": config_data, "force": force}),
+    )
+    message = "attached to identical pipeline run" if attached else "pipeline queued"
+    return jsonify({"message": message, "attached": attached, "job": job.to_dict()}), 202
 
-    generated_input = parse_collector_output_path(collector.get("stdout", ""))
-    formatter_args = None
-    if generated_input and generated_input.exists():
-        try:
-            relative_input = generated_input.relative_to(BASE_DIR)
-            formatter_args = [str(relative_input).replace("\\", "/")]
-        except ValueError:
-            formatter_args = [str(generated_input)]
-
-    formatter = run_python_script("final_format.py", formatter_args)
-    if not formatter["ok"]:
-        return (
-            jsonify(
-                {
-                    "message": "final_format.py failed",
-                    "stage": "formatter",
-                    "details": formatter,
-                }
-            ),
-            500,
-        )
 
+@app.get("/api/jobs")
+def api_list_jobs():
     return jsonify(
         {
-            "message": "pipeline completed",
-            "collector": collector,
-            "formatter": formatter,
+            "max_concurrent": jobs.max_workers,
+            "queued": jobs.queue_length(),
+            "jobs": [job.to_dict() for job in jobs.list()],
         }
     )
 
 
+@app.get("/api/jobs/<job_id>")
+def api_get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"message": f"Job not found: {job_id}"}), 404
+    return jsonify(job.to_dict(include_log=True))
+
+
+@app.get("/api/jobs/<job_id>/events")
+def api_job_events(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"message": f"Job not found: {job_id}"}), 404
+    return Response(
+        stream_with_context(iter_job_events(job)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def build_request_plan(config_data):
+    # Imported lazily so the dashboard still starts without the Google client libraries.
+    from gsc_data_collector import get_date_range, plan_requests
+
+    start_date, end_date = get_date_range(config_data)
+    return plan_requests(config_data, start_date, end_date)
+
+
+@app.get("/api/plan")
+def api_get_plan():
+    try:
+        plan = build_request_plan(load_config())
+    except Exception as exc:
+        return jsonify({"message": f"Failed to build request plan: {exc}"}), 500
+    return jsonify(plan)
+
+
+@app.post("/api/plan")
+def api_post_plan():
+    config_data = request.get_json(silent=True)
+    if not isinstance(config_data, dict):
+        return jsonify({"message": "Invalid config payload"}), 400
+    try:
+        plan = build_request_plan(config_data)
+    except Exception as exc:
+        return jsonify({"message": f"Failed to build request plan: {exc}"}), 500
+    return jsonify(plan)
+
+
 @app.get("/api/download-output")
 def api_download_output():
     config_data = load_config()
@@ -430,18 +649,35 @@ def api_preview_data():
     if not input_path.exists() or not input_path.is_file():
         return jsonify({"rows": [], "message": f"Preview file not found: {input_path}"})
 
+    sort = request.args.get("sort", default="", type=str)
+    order = request.args.get("order", default="descending", type=str)
+    if sort not in METRIC_COLUMNS:
+        sort = None
+    if order not in {"ascending", "descending"}:
+        order = "descending"
+
+    started = time.monotonic()
     try:
-        rows = load_preview_rows(input_path, row_limit=1000)
+        preview = get_preview_index(input_path).page(
+            page=request.args.get("page", default=1, type=int),
+            page_size=request.args.get("page_size", default=100, type=int),
+            sort=sort,
+            order=order,
+            query=request.args.get("q", default="", type=str).strip(),
+        )
     except Exception as exc:
-        return jsonify({"rows": [], "message": f"Failed to read preview CSV: {exc}"}), 500
+        return jsonify({"rows": [], "message": f"Failed to read preview file: {exc}"}), 500
 
-    return jsonify(
+    preview.update(
         {
-            "rows": rows,
             "source": str(input_path),
-            "count": len(rows),
+            "count": len(preview["rows"]),
+            "sort": sort,
+            "order": order,
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
         }
     )
+    return jsonify(preview)
 
 
 @app.get("/<path:file_name>")
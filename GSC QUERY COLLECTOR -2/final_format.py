@@ -3,22 +3,20 @@
 import argparse
 import csv
 import os
-import re
 from collections import OrderedDict
-from urllib.parse import urlparse
 
 import yaml
 
-
-CONFIG_FILE = "config.yaml"
+from city_index import extract_country_city_from_url, load_city_index
+from output_sinks import (
+    OutputReader,
+    detect_output_format,
+    is_normalized_output,
+    iter_normalized_pages,
+)
 
 
-def normalize_slug(value):
-    if not value:
-        return ""
-    value = value.strip().lower()
-    value = re.sub(r"[^a-z0-9]+", "-", value)
-    return value.strip("-")
+CONFIG_FILE = "config.yaml"
 
 
 def load_config(config_path=None):
@@ -67,6 +65,8 @@ def resolve_output_path(input_path, output_path, config):
         return configured_output
 
     base, ext = os.path.splitext(input_path)
+    if detect_output_format(input_path) != "csv":
+        ext = ".csv"
     ext = ext or ".csv"
     return f"{base}_final_format{ext}"
 
@@ -90,50 +90,16 @@ def format_number(value):
     return f"{value:.6f}".rstrip("0").rstrip(".") if isinstance(value, float) else value
 
 
-def resolve_city_csv_path(config):
-    city_cfg = config.get("city_mapping", {})
-    csv_file = city_cfg.get("csv_file", "all-cities.csv")
-
-    if os.path.isabs(csv_file):
-        return csv_file
-
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(base_dir, csv_file)
-
-
 def load_country_mapping(config):
-    csv_path = resolve_city_csv_path(config)
-    if not os.path.exists(csv_path):
+    city_index = load_city_index(config)
+    if city_index is None:
         return {}
-
-    mapping = {}
-    with open(csv_path, "r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            country = str(row.get("country", "")).strip()
-            if not country:
-                continue
-            slug = normalize_slug(country)
-            if slug and slug not in mapping:
-                mapping[slug] = country
-
-    return mapping
+    return city_index.by_country
 
 
 def extract_country_slug_from_url(page_url):
-    if not page_url:
-        return ""
-
-    parsed = urlparse(page_url)
-    parts = [p for p in parsed.path.split("/") if p]
-    if "countries" not in parts:
-        return ""
-
-    idx = parts.index("countries")
-    if idx + 1 >= len(parts):
-        return ""
-
-    return normalize_slug(parts[idx + 1])
+    country_slug, _ = extract_country_city_from_url(page_url)
+    return country_slug
 
 
 def resolve_country(country_value, page_url, country_mapping):
@@ -147,12 +113,78 @@ def resolve_country(country_value, page_url, country_mapping):
     return country_mapping.get(slug, slug.replace("-", " "))
 
 
+def write_final_rows(output_path, rows):
+    with open(output_path, "w", encoding="utf-8", newline="") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(
+            [
+                "language",
+                "id",
+                "country",
+                "city",
+                "page",
+                "queries",
+                "clicks",
+                "impressions",
+                "ctr",
+                "position",
+            ]
+        )
+
+        for (language, item_id, country, city, page), grouped_data in rows:
+            writer.writerow(
+                [
+                    language,
+                    item_id,
+                    country,
+                    city,
+                    page,
+                    ", ".join(grouped_data["queries"]),
+                    format_number(grouped_data["clicks"]),
+                    format_number(grouped_data["impressions"]),
+                    format_number(grouped_data["ctr"]),
+                    format_number(grouped_data["position"]),
+                ]
+            )
+
+
+def iter_normalized_groups(input_path, config, expected_mode=None):
+    # Normalized output already has one row per page, so no max()-based dedup
+    # over repeated query rows is needed.
+    country_mapping = load_country_mapping(config)
+
+    for page_row, page_edges in iter_normalized_pages(input_path):
+        row_mode = page_row["mode"].strip().lower()
+        if expected_mode and row_mode and row_mode != expected_mode:
+            raise ValueError(
+                f"Mode mismatch in input page {page_row['page_id']}: expected '{expected_mode}', got '{row_mode}'."
+            )
+
+        page = page_row["page"].strip()
+        if not page:
+            continue
+
+        country = resolve_country(page_row["country"].strip(), page, country_mapping)
+        queries = [edge["query"].strip() for edge in page_edges if edge["query"].strip()]
+        group_key = (page_row["language"].strip(), page_row["id"].strip(), country, page_row["city"].strip(), page)
+        yield group_key, {
+            "queries": list(dict.fromkeys(queries)),
+            "clicks": to_float(page_row["clicks"]),
+            "impressions": to_float(page_row["impressions"]),
+            "ctr": to_float(page_row["ctr"]),
+            "position": to_float(page_row["position"]),
+        }
+
+
 def convert_csv(input_path, output_path, config, expected_mode=None):
+    if is_normalized_output(input_path):
+        write_final_rows(output_path, iter_normalized_groups(input_path, config, expected_mode))
+        return
+
     grouped = OrderedDict()
     country_mapping = load_country_mapping(config)
 
-    with open(input_path, "r", encoding="utf-8", newline="") as infile:
-        reader = csv.DictReader(infile)
+    with OutputReader(input_path) as reader:
         if not reader.fieldnames:
             raise ValueError("Input CSV is empty or missing headers.")
 
@@ -239,38 +271,7 @@ def convert_csv(input_path, output_path, config, expected_mode=None):
                         grouped[group_key]["position_simple_sum"] / grouped[group_key]["metric_count"]
                     )
 
-    with open(output_path, "w", encoding="utf-8", newline="") as outfile:
-        writer = csv.writer(outfile)
-        writer.writerow(
-            [
-                "language",
-                "id",
-                "country",
-                "city",
-                "page",
-                "queries",
-                "clicks",
-                "impressions",
-                "ctr",
-                "position",
-            ]
-        )
-
-        for (language, item_id, country, city, page), grouped_data in grouped.items():
-            writer.writerow(
-                [
-                    language,
-                    item_id,
-                    country,
-                    city,
-                    page,
-                    ", ".join(grouped_data["queries"]),
-                    format_number(grouped_data["clicks"]),
-                    format_number(grouped_data["impressions"]),
-                    format_number(grouped_data["ctr"]),
-                    format_number(grouped_data["position"]),
-                ]
-            )
+    write_final_rows(output_path, grouped.items())
 
 
 def parse_args():
@@ -281,7 +282,7 @@ def parse_args():
         "input_csv",
         nargs="?",
         default=None,
-        help="Path to input CSV file (optional if set in config.yaml)",
+        help="Path to collector output: CSV, Parquet or SQLite (optional if set in config.yaml)",
     )
     parser.add_argument(
         "-o",
@@ -300,16 +301,21 @@ def parse_args():
     return parser.parse_args()
 
 
-def main():
-    args = parse_args()
-    config = load_config(args.config_path)
-    input_csv = resolve_input_path(args.input_csv, config)
-    output_csv = resolve_output_path(input_csv, args.output_csv, config)
+def format_output(config, input_csv=None, output_csv=None):
+    input_csv = resolve_input_path(input_csv, config)
+    output_csv = resolve_output_path(input_csv, output_csv, config)
     expected_mode = str(config.get("extraction_mode", "")).strip().lower()
     if expected_mode not in {"query_wise", "page_wise"}:
         expected_mode = None
     convert_csv(input_csv, output_csv, config, expected_mode=expected_mode)
     print(f"Done. Output written to: {output_csv}")
+    return output_csv
+
+
+def main():
+    args = parse_args()
+    config = load_config(args.config_path)
+    format_output(config, args.input_csv, args.output_csv)
 
 
 if __name__ == "__main__":
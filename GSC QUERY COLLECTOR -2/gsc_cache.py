@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+DEFAULT_CACHE_DIRECTORY = ".gsc_cache"
+
+
+def resolve_cache_directory(cache_cfg):
+    configured = cache_cfg.get("directory") or DEFAULT_CACHE_DIRECTORY
+    if os.path.isabs(configured):
+        return configured
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, configured)
+
+
+def canonical_request_key(site_url, body):
+    payload = json.dumps(
+        {"siteUrl": site_url, "body": body},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_final_date_range(body, final_after_days, today=None):
+    end_date = str(body.get("endDate", "")).strip()
+    if not end_date:
+        return False
+    try:
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        return False
+    today = today or datetime.now().date()
+    return end <= today - timedelta(days=final_after_days)
+
+
+class ResponseCache:
+    def __init__(self, directory, max_size_bytes=0, final_after_days=3, ttl_seconds=6 * 3600):
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+        self.final_after_days = final_after_days
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._iter_entries())
+
+    @classmethod
+    def from_config(cls, config):
+        cache_cfg = config.get("cache") or {}
+        if not cache_cfg.get("enabled", False):
+            return None
+
+        max_size_mb = cache_cfg.get("max_size_mb", 512) or 0
+        ttl_hours = cache_cfg.get("ttl_hours", 6)
+        return cls(
+            resolve_cache_directory(cache_cfg),
+            max_size_bytes=int(float(max_size_mb) * 1024 * 1024),
+            final_after_days=int(cache_cfg.get("final_after_days", 3)),
+            ttl_seconds=float(ttl_hours if ttl_hours is not None else 6) * 3600,
+        )
+
+    def _path_for(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _iter_entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._size -= size
+
+    def get(self, site_url, body):
+        path = self._path_for(canonical_request_key(site_url, body))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at < time.time():
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            # Touch the entry so size-based eviction drops least recently used files first.
+            os.utime(path, None)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry.get("response")
+
+    def put(self, site_url, body, response):
+        key = canonical_request_key(site_url, body)
+        path = self._path_for(key)
+        expires_at = None
+        if not is_final_date_range(body, self.final_after_days):
+            if self.ttl_seconds <= 0:
+                return
+            expires_at = time.time() + self.ttl_seconds
+
+        entry = {
+            "siteUrl": site_url,
+            "body": body,
+            "created_at": time.time(),
+            "expires_at": expires_at,
+            "response": response,
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, separators=(",", ":"))
+
+        previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += os.path.getsize(path) - previous_size
+            over_limit = self.max_size_bytes and self._size > self.max_size_bytes
+
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        target = int(self.max_size_bytes * 0.9)
+        entries = sorted(self._iter_entries(), key=lambda item: item[2])
+        for path, _, _ in entries:
+            with self._lock:
+                if self._size <= target:
+                    return
+                self.evictions += 1
+            self._remove(path)
+
+    def describe(self):
+        return (
+            f"{self.hits} hits, {self.misses} misses, {self.evictions} evicted, "
+            f"{self._size / (1024 * 1024):.1f} MB"
+        )
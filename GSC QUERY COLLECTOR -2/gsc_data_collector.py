@@ -1,17 +1,59 @@
 #!/usr/bin/env python3
 
-import csv
+import argparse
+import contextvars
+import copy
+import heapq
+import json
 import os
+import random
 import re
+import socket
 import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from itertools import count, islice, takewhile
 from urllib.parse import urlparse
 
 import yaml
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from city_index import (
+    CityIndex,
+    load_city_index,
+    load_city_matcher,
+    normalize_slug,
+    resolve_city_csv_path,
+)
+from gsc_cache import ResponseCache
+from gsc_warehouse import Warehouse, iter_days, resolve_warehouse_path
+from keyword_matcher import KeywordMatcher
+from output_sinks import (
+    build_output_filename,
+    get_output_format,
+    get_output_layout,
+    open_output_sink,
+    write_coverage,
+)
 
 CONFIG_FILE = "config.yaml"
+GSC_MAX_ROW_LIMIT = 25000
+GSC_MAX_REGEX_LENGTH = 4096
+# Constructs RE2 rejects, or matches differently from Python on non-ASCII text
+# (RE2's \w, \d, \s and \b are ASCII-only).
+RE2_INCOMPATIBLE_PATTERN = re.compile(
+    r"\\(?:[1-9ZbBdDsSwW]|g<)|\(\?(?!:|P<|[imsU]+[:)])"
+)
+# Set while fetching warehouse days: the warehouse marks a day final from the
+# date it was fetched, so its responses must come from the API, not the cache.
+_bypass_response_cache = contextvars.ContextVar("bypass_response_cache", default=False)
 
 
 def configure_stdio():
@@ -28,12 +70,512 @@ def load_config(config_path=None):
         return yaml.safe_load(f)
 
 
-def get_gsc_service(config):
-    credentials = service_account.Credentials.from_service_account_file(
+def get_gsc_credentials(config):
+    return service_account.Credentials.from_service_account_file(
         config["credentials_file"],
         scopes=["https://www.googleapis.com/auth/webmasters.readonly"],
     )
-    return build("searchconsole", "v1", credentials=credentials)
+
+
+def get_gsc_service(config, credentials=None):
+    if credentials is None:
+        credentials = get_gsc_credentials(config)
+    return build("searchconsole", "v1", credentials=credentials, cache_discovery=False)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_second=None):
+        try:
+            rate = float(requests_per_second or 0)
+        except (TypeError, ValueError):
+            rate = 0.0
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def describe(self):
+        if not self.interval:
+            return "no QPS limit"
+        return f"{1.0 / self.interval:g} req/s"
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def get_concurrency_settings(config):
+    concurrency_cfg = config.get("concurrency") or {}
+    try:
+        workers = int(concurrency_cfg.get("workers", 1) or 1)
+    except (TypeError, ValueError):
+        workers = 1
+    return max(1, workers), concurrency_cfg.get("requests_per_second")
+
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded")
+
+
+def _parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def classify_api_error(exc):
+    # Returns (retryable, throttled, retry_after_seconds).
+    if isinstance(exc, HttpError):
+        status = getattr(exc.resp, "status", None)
+        try:
+            status = int(status)
+        except (TypeError, ValueError):
+            status = None
+        content = exc.content.decode("utf-8", "replace") if isinstance(exc.content, bytes) else str(exc.content or "")
+        throttled = status == 429 or (
+            status == 403 and any(reason in content for reason in RATE_LIMIT_REASONS)
+        )
+        retryable = throttled or status in RETRYABLE_STATUS_CODES
+        return retryable, throttled, _parse_retry_after(exc.resp.get("retry-after"))
+    if isinstance(exc, (ConnectionError, TimeoutError, socket.timeout)):
+        return True, False, None
+    return False, False, None
+
+
+class RateController:
+    def __init__(self, config):
+        concurrency_cfg = config.get("concurrency") or {}
+        retry_cfg = config.get("retry") or {}
+        self.max_limit, requests_per_second = get_concurrency_settings(config)
+        self.min_limit = min(self.max_limit, max(1, int(concurrency_cfg.get("min_workers", 1) or 1)))
+        self.requests_per_minute = int(concurrency_cfg.get("requests_per_minute", 0) or 0)
+        self.max_retries = int(retry_cfg.get("max_retries", 5) or 0)
+        self.base_delay = float(retry_cfg.get("base_delay_seconds", 1) or 0)
+        self.max_delay = float(retry_cfg.get("max_delay_seconds", 60) or 0)
+        self.limiter = RateLimiter(requests_per_second)
+
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self._recent = deque()
+        self._condition = threading.Condition()
+
+    def _quota_wait(self):
+        # Called with the condition held; takes a slot in the sliding one-minute
+        # window and returns 0, or returns the seconds until a slot frees up.
+        if not self.requests_per_minute:
+            return 0
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+        if len(self._recent) < self.requests_per_minute:
+            self._recent.append(now)
+            return 0
+        return 60 - (now - self._recent[0])
+
+    def _acquire(self):
+        with self._condition:
+            # Both limits are checked in one pass, so a request that waited for
+            # quota still respects a concurrency limit lowered meanwhile.
+            while True:
+                if self.in_flight >= int(self.limit):
+                    self._condition.wait()
+                    continue
+                wait = self._quota_wait()
+                if not wait:
+                    break
+                self._condition.wait(wait)
+            self.in_flight += 1
+            self.requests += 1
+        self.limiter.acquire()
+
+    def _release(self, succeeded=True, backoff=False, throttled=False):
+        # AIMD: successes grow the limit, retryable failures halve it, and other
+        # errors (400, a plain 403) say nothing about load and leave it alone.
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+            if backoff:
+                self.limit = max(float(self.min_limit), self.limit / 2)
+            elif succeeded:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def _backoff_delay(self, attempt, retry_after):
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def call(self, fn):
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                result = fn()
+            except Exception as exc:
+                retryable, throttled, retry_after = classify_api_error(exc)
+                self._release(succeeded=False, backoff=retryable, throttled=throttled)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt, retry_after)
+                attempt += 1
+                with self._condition:
+                    self.retries += 1
+                print(
+                    f"[RETRY] {type(exc).__name__} (attempt {attempt}/{self.max_retries}), "
+                    f"waiting {delay:.1f}s; concurrency now {int(self.limit)}"
+                )
+                time.sleep(delay)
+                continue
+            self._release()
+            return result
+
+    def describe(self):
+        quota = f"{self.requests_per_minute}/min quota" if self.requests_per_minute else "no minute quota"
+        return f"{self.limiter.describe()}, {quota}, AIMD {self.min_limit}-{self.max_limit}"
+
+    def summary(self):
+        return (
+            f"{self.requests} requests, {self.retries} retries, "
+            f"{self.throttled} throttled, concurrency {int(self.limit)}/{self.max_limit}"
+        )
+
+
+class SingleFlightMemo:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._results = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, fn):
+        while True:
+            with self._lock:
+                if key in self._results:
+                    self.hits += 1
+                    return self._results[key]
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another worker is already fetching this key; wait for its result.
+            event.wait()
+
+        try:
+            value = fn()
+            with self._lock:
+                self._results[key] = value
+            return value
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            event.set()
+
+    def describe(self):
+        return f"{self.hits} hits, {self.misses} misses"
+
+
+class CollectionCancelled(Exception):
+    pass
+
+
+class RequestBudget:
+    def __init__(self, controller, max_requests=0, deadline_seconds=0, priority="clicks"):
+        self.controller = controller
+        self.max_requests = max_requests
+        self.deadline_seconds = deadline_seconds
+        self.priority = priority
+        self.start_requests = controller.requests
+        self.started = time.monotonic()
+        self.reserved = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, controller):
+        budget_cfg = config.get("budget") or {}
+        if not budget_cfg.get("enabled", False):
+            return None
+        priority = str(budget_cfg.get("priority", "clicks")).strip().lower()
+        return cls(
+            controller,
+            max_requests=int(budget_cfg.get("max_requests", 0) or 0),
+            deadline_seconds=float(budget_cfg.get("deadline_seconds", 0) or 0),
+            priority=priority if priority in {"clicks", "impressions"} else "clicks",
+        )
+
+    def used(self):
+        return self.controller.requests - self.start_requests
+
+    def reserve(self, count):
+        # Claims up to count requests for dispatch; languages share one budget,
+        # so requests already dispatched elsewhere are not handed out twice.
+        with self._lock:
+            if self.max_requests:
+                count = max(0, min(count, self.max_requests - self.used() - self.reserved))
+            self.reserved += count
+            return count
+
+    def release(self, count):
+        with self._lock:
+            self.reserved -= count
+
+    def stop_reason(self):
+        if self.max_requests and self.used() >= self.max_requests:
+            return "request limit"
+        if self.deadline_seconds and time.monotonic() - self.started >= self.deadline_seconds:
+            return "deadline"
+        return None
+
+    def describe(self):
+        limits = []
+        if self.max_requests:
+            limits.append(f"{self.max_requests} requests")
+        if self.deadline_seconds:
+            limits.append(f"{self.deadline_seconds:g}s")
+        return f"{', '.join(limits) or 'unlimited'}, {self.priority} first"
+
+
+class ProgressTracker:
+    # Thread-safe counters behind the per-language progress prints, so a caller
+    # such as the dashboard can report a run while it is in flight.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.languages = {}
+        self.rows = 0
+        self.controller = None
+        self.requests_before = 0
+        self.planned_requests = 0
+        self.started = None
+
+    def start(self, controller, planned_requests, language_labels):
+        with self._lock:
+            self.controller = controller
+            self.requests_before = controller.requests
+            self.planned_requests = planned_requests
+            self.started = time.monotonic()
+            for lang_label in language_labels:
+                self._language(lang_label)
+
+    def _language(self, lang_label):
+        return self.languages.setdefault(
+            lang_label,
+            {"pages_done": 0, "pages_total": 0, "listed": False, "finished": False, "rows": 0},
+        )
+
+    def add_pages(self, lang_label, count, listed=False):
+        with self._lock:
+            language = self._language(lang_label)
+            language["pages_total"] += count
+            language["listed"] = language["listed"] or listed
+
+    def listing_done(self, lang_label):
+        with self._lock:
+            self._language(lang_label)["listed"] = True
+
+    def page_done(self, lang_label):
+        with self._lock:
+            self._language(lang_label)["pages_done"] += 1
+
+    def language_done(self, lang_label, rows):
+        with self._lock:
+            language = self._language(lang_label)
+            language["finished"] = True
+            language["rows"] = rows
+
+    def track_rows(self, rows):
+        for row in rows:
+            self.rows += 1
+            yield row
+
+    def snapshot(self):
+        with self._lock:
+            languages = {label: dict(language) for label, language in self.languages.items()}
+        requests = self.controller.requests - self.requests_before if self.controller else 0
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        pages_done = sum(language["pages_done"] for language in languages.values())
+        pages_total = sum(language["pages_total"] for language in languages.values())
+
+        # Page counts are exact once every language has listed its pages; until
+        # then the planner's request estimate (an upper bound) is the yardstick.
+        if languages and pages_total and all(
+            language["listed"] or language["finished"] for language in languages.values()
+        ):
+            fraction = pages_done / pages_total
+        elif self.planned_requests:
+            fraction = min(1.0, requests / self.planned_requests)
+        else:
+            fraction = 0.0
+        if languages and all(language["finished"] for language in languages.values()):
+            fraction = 1.0
+
+        return {
+            "languages": languages,
+            "pages_done": pages_done,
+            "pages_total": pages_total,
+            "requests": requests,
+            "planned_requests": self.planned_requests,
+            "rows_written": self.rows,
+            "elapsed_seconds": round(elapsed, 1),
+            "fraction": round(fraction, 4),
+            "eta_seconds": round(elapsed * (1 - fraction) / fraction, 1) if fraction > 0 else None,
+        }
+
+
+class GscClient:
+    # httplib2 transports are not thread-safe, so every worker thread builds
+    # its own service object from the shared credentials.
+
+    def __init__(self, config, credentials=None, service_factory=None):
+        self.config = config
+        self.site_url = config["site_url"]
+        self.workers, _ = get_concurrency_settings(config)
+        self.controller = RateController(config)
+        self.cache = ResponseCache.from_config(config)
+        self.warehouse = None
+        self.page_queries_memo = SingleFlightMemo()
+        self.sweep_memo = SingleFlightMemo()
+        self.language_timings = []
+        self.budget = None
+        self.coverage = []
+        self.progress = ProgressTracker()
+        self.cancelled = threading.Event()
+        self._credentials = credentials
+        self._service_factory = service_factory or get_gsc_service
+        self._credentials_lock = threading.Lock()
+        self._local = threading.local()
+        self._pool = None
+
+    def for_property(self, config):
+        # A client for another property that shares this one's worker pool,
+        # per-thread services, rate budget, cache and warehouse; only the
+        # property and its per-run memos are separate.
+        if get_fetch_strategy(config) == "warehouse":
+            self.get_warehouse()
+        if self.workers > 1:
+            self._get_pool()
+        client = copy.copy(self)
+        client.config = config
+        client.site_url = config["site_url"]
+        client.page_queries_memo = SingleFlightMemo()
+        client.sweep_memo = SingleFlightMemo()
+        client.language_timings = []
+        client.budget = None
+        client.coverage = []
+        client.progress = ProgressTracker()
+        client.cancelled = threading.Event()
+        if config.get("credentials_file") != self.config.get("credentials_file"):
+            client._credentials = None
+            client._credentials_lock = threading.Lock()
+            client._local = threading.local()
+        return client
+
+    def _get_pool(self):
+        with self._credentials_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        if self.warehouse is not None:
+            self.warehouse.close()
+            self.warehouse = None
+
+    def get_warehouse(self):
+        with self._credentials_lock:
+            if self.warehouse is None:
+                self.warehouse = Warehouse.from_config(self.config)
+            return self.warehouse
+
+    def _get_service(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            with self._credentials_lock:
+                if self._credentials is None:
+                    self._credentials = get_gsc_credentials(self.config)
+            service = self._service_factory(self.config, self._credentials)
+            self._local.service = service
+        return service
+
+    def query(self, body):
+        if self.cancelled.is_set():
+            raise CollectionCancelled("Collection was cancelled.")
+        use_cache = self.cache is not None and not _bypass_response_cache.get()
+        if use_cache:
+            cached = self.cache.get(self.site_url, body)
+            if cached is not None:
+                return cached
+
+        response = self.controller.call(
+            lambda: self._get_service()
+            .searchanalytics()
+            .query(siteUrl=self.site_url, body=body)
+            .execute()
+        )
+
+        if use_cache:
+            self.cache.put(self.site_url, body, response)
+        return response
+
+    def _run_in_worker(self, fn, item):
+        self._local.in_worker = True
+        try:
+            return fn(item)
+        finally:
+            self._local.in_worker = False
+
+    def imap(self, fn, items):
+        nested = getattr(self._local, "in_worker", False)
+        if nested or self.workers <= 1:
+            for item in items:
+                yield fn(item)
+            return
+
+        # Results are yielded in input order while at most 2 * workers tasks are queued,
+        # so callers can stream output without materializing every item first. The
+        # pool outlives each call, so worker threads keep their authenticated services.
+        # Tasks run in a copy of the caller's context, so context-local state such
+        # as the dashboard's per-job log follows the work into the pool.
+        pool = self._get_pool()
+        pending = deque()
+        for item in items:
+            pending.append(
+                pool.submit(contextvars.copy_context().run, self._run_in_worker, fn, item)
+            )
+            if len(pending) >= self.workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def map(self, fn, items):
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        return list(self.imap(fn, items))
 
 
 def get_date_range(config):
@@ -61,16 +603,17 @@ def build_regex_pattern(config):
     if not raw:
         return None
 
+    # Keyword lists go through an Aho-Corasick matcher, which stays linear in
+    # the query length no matter how many keywords are configured.
     if isinstance(raw, list):
-        pattern_str = "|".join(re.escape(kw.strip()) for kw in raw if kw.strip())
-    else:
-        raw = raw.strip()
-        if "," in raw:
-            pattern_str = "|".join(
-                re.escape(kw.strip()) for kw in raw.split(",") if kw.strip()
-            )
-        else:
-            pattern_str = raw
+        matcher = KeywordMatcher(str(kw) for kw in raw)
+        return matcher if matcher.keywords else None
+
+    raw = raw.strip()
+    if "," in raw:
+        matcher = KeywordMatcher(raw.split(","))
+        return matcher if matcher.keywords else None
+    pattern_str = raw
 
     if not pattern_str:
         return None
@@ -82,106 +625,93 @@ def build_regex_pattern(config):
         return None
 
 
-def normalize_slug(value):
-    if not value:
-        return ""
-    value = value.strip().lower()
-    value = re.sub(r"[^a-z0-9]+", "-", value)
-    return value.strip("-")
-
-
 def load_city_mapping(config):
-    city_cfg = config.get("city_mapping", {})
-    csv_file = city_cfg.get("csv_file", "all-cities.csv")
+    city_index = load_city_index(config)
+    if city_index is None:
+        print(f"[WARNING] City mapping file not found: {resolve_city_csv_path(config)}")
+        return CityIndex()
+    return city_index
 
-    if os.path.isabs(csv_file):
-        csv_path = csv_file
-    else:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        csv_path = os.path.join(base_dir, csv_file)
-
-    if not os.path.exists(csv_path):
-        print(f"[WARNING] City mapping file not found: {csv_path}")
-        return {"by_country_city": {}, "by_city": {}}
-
-    by_country_city = {}
-    by_city = {}
-    by_country = {}
-
-    with open(csv_path, "r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            city_id = str(row.get("id", "")).strip()
-            country = str(row.get("country", "")).strip()
-            city = str(row.get("city", "")).strip()
-            if not city:
-                continue
 
-            country_slug = normalize_slug(country)
-            city_slug = normalize_slug(city)
-            payload = {"id": city_id, "country": country, "city": city}
+def load_query_city_matcher(config):
+    if not config.get("city_mapping", {}).get("tag_queries", False):
+        return None
+    city_matcher = load_city_matcher(config)
+    if city_matcher is None:
+        print(f"[WARNING] City mapping file not found: {resolve_city_csv_path(config)}")
+    return city_matcher
 
-            by_country_city[(country_slug, city_slug)] = payload
-            by_city.setdefault(city_slug, []).append(payload)
-            if country_slug and country_slug not in by_country:
-                by_country[country_slug] = country
 
-    return {
-        "by_country_city": by_country_city,
-        "by_city": by_city,
-        "by_country": by_country,
-    }
+def resolve_city_details(page_url, city_mapping):
+    return city_mapping.resolve(page_url)
 
 
-def extract_country_city_from_url(page_url):
-    if not page_url:
-        return "", ""
+def build_query_regex_filter(config, regex_pattern):
+    if regex_pattern is None:
+        return None
 
-    parsed = urlparse(page_url)
-    parts = [p for p in parsed.path.split("/") if p]
+    regex_cfg = config.get("query_regex") or {}
+    if not regex_cfg.get("pushdown", True):
+        return None
 
-    country_slug = ""
-    city_slug = ""
+    if isinstance(regex_pattern, KeywordMatcher) and not regex_pattern.pushdown_safe:
+        return None
 
-    if "countries" in parts:
-        idx = parts.index("countries")
-        if idx + 1 < len(parts):
-            country_slug = normalize_slug(parts[idx + 1])
+    expression = f"(?i){regex_pattern.pattern}"
+    if RE2_INCOMPATIBLE_PATTERN.search(regex_pattern.pattern) or len(expression) > GSC_MAX_REGEX_LENGTH:
+        return None
 
-    for part in parts:
-        if part.startswith("prayer-times-"):
-            city_slug = normalize_slug(part.replace("prayer-times-", "", 1))
-            break
+    return {
+        "dimension": "query",
+        "operator": "includingRegex",
+        "expression": expression,
+    }
 
-    return country_slug, city_slug
 
+def get_regex_pushdown(config, regex_pattern):
+    # Returns the includingRegex filters for (seed queries, queries per page); None
+    # means the pattern is applied client-side for that request type instead.
+    if uses_local_index(config):
+        return None, None
 
-def resolve_city_details(page_url, city_mapping):
-    country_slug, city_slug = extract_country_city_from_url(page_url)
-    by_country = city_mapping.get("by_country", {})
-    resolved_country = by_country.get(country_slug, country_slug.replace("-", " ")) if country_slug else ""
+    query_filter = build_query_regex_filter(config, regex_pattern)
+    if query_filter is None:
+        return None, None
 
-    if not city_slug:
-        return {"id": "", "country": resolved_country, "city": ""}
+    query_limit = config["display"].get(
+        "queries_per_page", config["display"].get("top_queries_count", 0)
+    )
+    # Per-page queries are limited before the regex filter, so pushing the filter
+    # down is only equivalent when there is no per-page limit.
+    page_query_filter = query_filter if not query_limit else None
+    return query_filter, page_query_filter
 
-    by_country_city = city_mapping.get("by_country_city", {})
-    by_city = city_mapping.get("by_city", {})
 
-    matched = by_country_city.get((country_slug, city_slug))
-    if matched:
-        return matched
+def find_keyword_matches(pattern, text):
+    if isinstance(pattern, KeywordMatcher):
+        return pattern.find_all(text)
+    return list(dict.fromkeys(match.group(0) for match in pattern.finditer(text or "")))
 
-    fallback = by_city.get(city_slug, [])
-    if len(fallback) == 1:
-        return fallback[0]
 
-    return {"id": "", "country": resolved_country, "city": ""}
+def get_query_taggers(config, regex_pattern, city_matcher=None):
+    # (column, fn(query) -> text) pairs appended to every output row.
+    regex_cfg = config.get("query_regex") or {}
+    taggers = []
+    if regex_pattern is not None and regex_cfg.get("report_matches", False):
+        taggers.append(
+            ("matched_keywords", lambda query: ", ".join(find_keyword_matches(regex_pattern, query)))
+        )
+    if city_matcher is not None:
+        taggers.append(
+            ("query_cities", lambda query: ", ".join(city["city"] for city in city_matcher.tag(query)))
+        )
+    return taggers
 
 
 def apply_regex_filter(queries, pattern):
     if pattern is None:
         return queries
-    return [q for q in queries if pattern.search(q["query"])]
+    return (q for q in queries if pattern.search(q["query"]))
 
 
 def get_language_ids(config):
@@ -249,119 +779,183 @@ def _sort_rows(rows, sort_by, order):
     rows.sort(key=lambda x: x[sort_by], reverse=reverse)
 
 
-def get_top_queries_for_url(service, config, url_filter, start_date, end_date):
-    site_url = config["site_url"]
-    row_limit = config["api"]["row_limit"]
+def is_api_order(sort_by, order):
+    # searchanalytics returns rows ordered by clicks, descending.
+    return sort_by == "clicks" and order == "descending"
+
+
+def iter_sorted_rows(rows, config, api_order=False):
     sort_by, order = get_mode_sorting(config)
+    if api_order and is_api_order(sort_by, order):
+        return iter(rows)
+    rows = list(rows)
+    sort_rows(rows, sort_by, order)
+    return iter(rows)
+
+
+def iter_search_analytics_rows(client, body, row_limit):
+    page_size = min(row_limit, GSC_MAX_ROW_LIMIT) if row_limit else GSC_MAX_ROW_LIMIT
+    start_row = 0
+    while True:
+        response = client.query(dict(body, rowLimit=page_size, startRow=start_row))
+        batch = response.get("rows", [])
+        yield from batch
+        if len(batch) < page_size:
+            return
+        start_row += len(batch)
+
+
+def get_shard_days(config):
+    api_cfg = config.get("api") or {}
+    try:
+        shard_days = int(api_cfg.get("shard_days", 0) or 0)
+    except (TypeError, ValueError):
+        shard_days = 0
+    return max(0, shard_days)
+
+
+def split_date_range(start_date, end_date, shard_days):
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    shards = []
+    while start <= end:
+        shard_end = min(start + timedelta(days=shard_days - 1), end)
+        shards.append((start.strftime("%Y-%m-%d"), shard_end.strftime("%Y-%m-%d")))
+        start = shard_end + timedelta(days=1)
+    return shards
+
+
+def merge_shard_rows(shard_rows):
+    merged = {}
+    for rows in shard_rows:
+        for row in rows:
+            key = tuple(row["keys"])
+            if key not in merged:
+                merged[key] = _empty_metrics("keys", row["keys"])
+            _add_metrics(merged[key], row)
 
-    response = (
-        service.searchanalytics()
-        .query(
-            siteUrl=site_url,
-            body={
-                "startDate": start_date,
-                "endDate": end_date,
-                "dimensions": ["query"],
-                "rowLimit": row_limit,
-                "dimensionFilterGroups": [
-                    {
-                        "filters": [
-                            {
-                                "dimension": "page",
-                                "operator": "contains",
-                                "expression": url_filter,
-                            }
-                        ]
-                    }
-                ],
-            },
-        )
-        .execute()
-    )
+    results = [_finalize_metrics(target) for target in merged.values()]
+    results.sort(key=lambda x: x["clicks"], reverse=True)
+    return results
 
-    queries = []
-    for row in response.get("rows", []):
-        queries.append(
-            {
-                "query": row["keys"][0],
-                "clicks": row["clicks"],
-                "impressions": row["impressions"],
-                "ctr": row["ctr"],
-                "position": row["position"],
-            }
-        )
 
-    _sort_rows(queries, sort_by, order)
+def iter_report_rows(client, config, body):
+    row_limit = config["api"]["row_limit"]
+    shard_days = get_shard_days(config)
+    if not shard_days:
+        return iter_search_analytics_rows(client, body, row_limit)
+
+    shards = split_date_range(body["startDate"], body["endDate"], shard_days)
+    if len(shards) <= 1:
+        return iter_search_analytics_rows(client, body, row_limit)
+
+    def fetch_shard(shard):
+        shard_body = dict(body, startDate=shard[0], endDate=shard[1])
+        return list(iter_search_analytics_rows(client, shard_body, row_limit))
+
+    # Merged rows are re-sorted by clicks so callers can keep relying on API order.
+    return iter(merge_shard_rows(client.map(fetch_shard, shards)))
+
+
+def iter_metric_rows(api_rows, key):
+    for row in api_rows:
+        yield {
+            key: row["keys"][0],
+            "clicks": row["clicks"],
+            "impressions": row["impressions"],
+            "ctr": row["ctr"],
+            "position": row["position"],
+        }
+
+
+def _apply_mode_min_filter(rows, config, api_order=False):
+    sort_by, order = get_mode_sorting(config)
     min_impressions, min_clicks = get_mode_min_filter(config)
-    queries = apply_min_filter(
-        queries,
+    if api_order and min_clicks is not None and is_api_order(sort_by, order):
+        # Rows arrive in descending click order, so the first row under the
+        # threshold ends the stream and no further pages are requested.
+        rows = takewhile(lambda r: r["clicks"] >= min_clicks, rows)
+    return apply_min_filter(
+        rows,
         min_impressions=min_impressions,
         min_clicks=min_clicks,
     )
-    return queries
 
 
-def get_pages_for_query(service, config, query_text, url_filter, start_date, end_date):
-    site_url = config["site_url"]
-    row_limit = config["api"]["row_limit"]
-    sort_by, order = get_mode_sorting(config)
-    pages_per_query = config["display"].get("pages_per_query", 0)
+def get_top_queries_for_url(client, config, url_filter, start_date, end_date, query_filter=None):
+    filters = [
+        {
+            "dimension": "page",
+            "operator": "contains",
+            "expression": url_filter,
+        }
+    ]
+    if query_filter:
+        filters.append(query_filter)
+
+    api_rows = iter_report_rows(
+        client,
+        config,
+        {
+            "startDate": start_date,
+            "endDate": end_date,
+            "dimensions": ["query"],
+            "dimensionFilterGroups": [{"filters": filters}],
+        },
+    )
 
-    response = (
-        service.searchanalytics()
-        .query(
-            siteUrl=site_url,
-            body={
-                "startDate": start_date,
-                "endDate": end_date,
-                "dimensions": ["page"],
-                "rowLimit": row_limit,
-                "dimensionFilterGroups": [
-                    {
-                        "filters": [
-                            {
-                                "dimension": "query",
-                                "operator": "equals",
-                                "expression": query_text,
-                            },
-                            {
-                                "dimension": "page",
-                                "operator": "contains",
-                                "expression": url_filter,
-                            },
-                        ]
-                    }
-                ],
-            },
-        )
-        .execute()
+    return select_top_queries(iter_metric_rows(api_rows, "query"), config, api_order=True)
+
+
+def select_top_queries(queries, config, api_order=False):
+    queries = iter_sorted_rows(queries, config, api_order=api_order)
+    return _apply_mode_min_filter(queries, config, api_order=api_order)
+
+
+def get_pages_for_query(client, config, query_text, url_filter, start_date, end_date):
+    api_rows = iter_report_rows(
+        client,
+        config,
+        {
+            "startDate": start_date,
+            "endDate": end_date,
+            "dimensions": ["page"],
+            "dimensionFilterGroups": [
+                {
+                    "filters": [
+                        {
+                            "dimension": "query",
+                            "operator": "equals",
+                            "expression": query_text,
+                        },
+                        {
+                            "dimension": "page",
+                            "operator": "contains",
+                            "expression": url_filter,
+                        },
+                    ]
+                }
+            ],
+        },
     )
 
-    pages = []
-    for row in response.get("rows", []):
-        pages.append(
-            {
-                "page": row["keys"][0],
-                "clicks": row["clicks"],
-                "impressions": row["impressions"],
-                "ctr": row["ctr"],
-                "position": row["position"],
-            }
-        )
+    return select_pages_for_query(iter_metric_rows(api_rows, "page"), config, api_order=True)
 
-    _sort_rows(pages, sort_by, order)
+
+def select_pages_for_query(pages, config, api_order=False):
+    pages_per_query = config["display"].get("pages_per_query", 0)
+    pages = iter_sorted_rows(pages, config, api_order=api_order)
 
     range_filter = config.get("range_filter", {})
     if range_filter.get("enabled", False):
         start_row = range_filter.get("start_row", 1)
         end_row = range_filter.get("end_row")
         start_idx = max(0, start_row - 1)
-        end_idx = end_row if end_row else len(pages)
-        pages = pages[start_idx:end_idx]
-    elif pages_per_query > 0:
-        pages = pages[:pages_per_query]
-
-    return pages
+        end_idx = end_row if end_row else None
+        return list(islice(pages, start_idx, end_idx))
+    if pages_per_query > 0:
+        return list(islice(pages, pages_per_query))
+    return list(pages)
 
 
 def get_output_directory(config):
@@ -386,277 +980,999 @@ def sort_rows(rows, sort_by, order):
 def apply_min_filter(rows, min_impressions=None, min_clicks=None):
     filtered = rows
     if min_impressions is not None:
-        filtered = [r for r in filtered if r["impressions"] >= min_impressions]
+        filtered = (r for r in filtered if r["impressions"] >= min_impressions)
     if min_clicks is not None:
-        filtered = [r for r in filtered if r["clicks"] >= min_clicks]
+        filtered = (r for r in filtered if r["clicks"] >= min_clicks)
     return filtered
 
 
-def get_top_pages_for_url(service, config, url_filter, start_date, end_date):
-    site_url = config["site_url"]
-    row_limit = config["api"]["row_limit"]
-    sort_by, order = get_mode_sorting(config)
-    pages_limit = config["display"].get("pages_per_query", 0)
-
-    response = (
-        service.searchanalytics()
-        .query(
-            siteUrl=site_url,
-            body={
-                "startDate": start_date,
-                "endDate": end_date,
-                "dimensions": ["page"],
-                "rowLimit": row_limit,
-                "dimensionFilterGroups": [
-                    {
-                        "filters": [
-                            {
-                                "dimension": "page",
-                                "operator": "contains",
-                                "expression": url_filter,
-                            }
-                        ]
-                    }
-                ],
-            },
-        )
-        .execute()
+def get_top_pages_for_url(client, config, url_filter, start_date, end_date):
+    api_rows = iter_report_rows(
+        client,
+        config,
+        {
+            "startDate": start_date,
+            "endDate": end_date,
+            "dimensions": ["page"],
+            "dimensionFilterGroups": [
+                {
+                    "filters": [
+                        {
+                            "dimension": "page",
+                            "operator": "contains",
+                            "expression": url_filter,
+                        }
+                    ]
+                }
+            ],
+        },
     )
 
-    pages = []
-    for row in response.get("rows", []):
-        pages.append(
-            {
-                "page": row["keys"][0],
-                "clicks": row["clicks"],
-                "impressions": row["impressions"],
-                "ctr": row["ctr"],
-                "position": row["position"],
-            }
-        )
+    return select_top_pages(iter_metric_rows(api_rows, "page"), config, api_order=True)
 
-    sort_rows(pages, sort_by, order)
-    min_impressions, min_clicks = get_mode_min_filter(config)
-    pages = apply_min_filter(
-        pages,
-        min_impressions=min_impressions,
-        min_clicks=min_clicks,
-    )
+
+def select_top_pages(pages, config, api_order=False):
+    pages_limit = config["display"].get("pages_per_query", 0)
+    pages = iter_sorted_rows(pages, config, api_order=api_order)
+    pages = _apply_mode_min_filter(pages, config, api_order=api_order)
 
     if pages_limit > 0:
-        pages = pages[:pages_limit]
+        return list(islice(pages, pages_limit))
+    return list(pages)
 
-    return pages
 
+def get_queries_for_page(client, config, page_url, start_date, end_date, query_filter=None):
+    filters = [
+        {
+            "dimension": "page",
+            "operator": "equals",
+            "expression": page_url,
+        }
+    ]
+    if query_filter:
+        filters.append(query_filter)
+
+    body = {
+        "startDate": start_date,
+        "endDate": end_date,
+        "dimensions": ["query"],
+        "dimensionFilterGroups": [{"filters": filters}],
+    }
 
-def get_queries_for_page(service, config, page_url, start_date, end_date):
-    site_url = config["site_url"]
-    row_limit = config["api"]["row_limit"]
-    sort_by, order = get_mode_sorting(config)
+    def fetch():
+        api_rows = iter_report_rows(client, config, body)
+        return select_queries_for_page(iter_metric_rows(api_rows, "query"), config, api_order=True)
+
+    memo_key = (
+        page_url,
+        start_date,
+        end_date,
+        json.dumps(body["dimensionFilterGroups"], sort_keys=True),
+    )
+    return list(client.page_queries_memo.get_or_compute(memo_key, fetch))
+
+
+def select_queries_for_page(queries, config, api_order=False):
     query_limit = config["display"].get(
         "queries_per_page", config["display"].get("top_queries_count", 0)
     )
+    queries = iter_sorted_rows(queries, config, api_order=api_order)
 
-    response = (
-        service.searchanalytics()
-        .query(
-            siteUrl=site_url,
-            body={
-                "startDate": start_date,
-                "endDate": end_date,
-                "dimensions": ["query"],
-                "rowLimit": row_limit,
-                "dimensionFilterGroups": [
-                    {
-                        "filters": [
-                            {
-                                "dimension": "page",
-                                "operator": "equals",
-                                "expression": page_url,
-                            }
-                        ]
-                    }
-                ],
-            },
-        )
-        .execute()
+    if query_limit > 0:
+        return list(islice(queries, query_limit))
+    return list(queries)
+
+
+def get_fetch_strategy(config):
+    api_cfg = config.get("api") or {}
+    strategy = str(api_cfg.get("fetch_strategy", "per_request")).strip().lower()
+    return strategy if strategy in {"per_request", "sweep", "warehouse"} else "per_request"
+
+
+def uses_local_index(config):
+    return get_fetch_strategy(config) in {"sweep", "warehouse"}
+
+
+def fetch_page_query_rows(client, config, url_filter, start_date, end_date, page_filter=None):
+    if page_filter is None:
+        page_filter = {
+            "dimension": "page",
+            "operator": "contains",
+            "expression": url_filter,
+        }
+    return iter_report_rows(
+        client,
+        config,
+        {
+            "startDate": start_date,
+            "endDate": end_date,
+            "dimensions": ["page", "query"],
+            "dimensionFilterGroups": [{"filters": [page_filter]}],
+        },
     )
 
-    queries = []
-    for row in response.get("rows", []):
-        queries.append(
-            {
-                "query": row["keys"][0],
-                "clicks": row["clicks"],
-                "impressions": row["impressions"],
-                "ctr": row["ctr"],
-                "position": row["position"],
-            }
+
+def get_language_url_filters(config):
+    target_url = config["target_url"]
+    url_filters = [build_url_for_language(target_url, lang_id) for lang_id in get_language_ids(config)]
+    return list(dict.fromkeys(url_filters))
+
+
+def uses_cross_language_sweep(config):
+    api_cfg = config.get("api") or {}
+    if not api_cfg.get("cross_language_sweep", False) or not uses_local_index(config):
+        return False
+    return len(get_language_url_filters(config)) > 1
+
+
+def build_page_prefix_filter(url_filters):
+    # Unanchored alternation of the literal prefixes matches exactly the pages
+    # the per-language `contains` filters would.
+    return {
+        "dimension": "page",
+        "operator": "includingRegex",
+        "expression": "|".join(re.escape(url_filter) for url_filter in url_filters),
+    }
+
+
+def demultiplex_rows(api_rows, url_filters):
+    streams = {url_filter: [] for url_filter in url_filters}
+    for row in api_rows:
+        page = row["keys"][0]
+        for url_filter in url_filters:
+            if url_filter in page:
+                streams[url_filter].append(row)
+    return streams
+
+
+def fetch_cross_language_rows(client, config, start_date, end_date):
+    url_filters = get_language_url_filters(config)
+
+    def fetch():
+        api_rows = fetch_page_query_rows(
+            client, config, None, start_date, end_date, page_filter=build_page_prefix_filter(url_filters)
         )
+        return demultiplex_rows(api_rows, url_filters)
 
-    sort_rows(queries, sort_by, order)
+    memo_key = ("sweep", start_date, end_date, tuple(url_filters))
+    return client.sweep_memo.get_or_compute(memo_key, fetch)
 
-    if query_limit > 0:
-        queries = queries[:query_limit]
 
-    return queries
+def _empty_metrics(key, value):
+    return {
+        key: value,
+        "clicks": 0,
+        "impressions": 0,
+        "ctr": 0.0,
+        "position": 0.0,
+        "position_weighted_sum": 0.0,
+    }
+
+
+def _add_metrics(target, row):
+    target["clicks"] += row["clicks"]
+    target["impressions"] += row["impressions"]
+    target["position_weighted_sum"] += row["position"] * row["impressions"]
+
+
+def _finalize_metrics(target):
+    weighted_sum = target.pop("position_weighted_sum")
+    if target["impressions"] > 0:
+        target["ctr"] = target["clicks"] / target["impressions"]
+        target["position"] = weighted_sum / target["impressions"]
+    return target
+
+
+def _without_response_cache(fn, *args):
+    token = _bypass_response_cache.set(True)
+    try:
+        return fn(*args)
+    finally:
+        _bypass_response_cache.reset(token)
+
+
+def sync_warehouse(client, config, warehouse, url_filter, start_date, end_date):
+    missing = warehouse.missing_days(client.site_url, url_filter, start_date, end_date)
+
+    def fetch_day(day):
+        api_rows = list(fetch_page_query_rows(client, config, url_filter, day, day))
+        return warehouse.store_day(client.site_url, url_filter, day, api_rows)
+
+    stored_rows = client.map(lambda day: _without_response_cache(fetch_day, day), missing)
+    return len(missing), sum(stored_rows)
+
+
+def sync_warehouse_cross_language(client, config, warehouse, start_date, end_date):
+    url_filters = get_language_url_filters(config)
+    page_filter = build_page_prefix_filter(url_filters)
+
+    def sync():
+        missing = sorted(
+            set().union(
+                *(
+                    warehouse.missing_days(client.site_url, url_filter, start_date, end_date)
+                    for url_filter in url_filters
+                )
+            )
+        )
+
+        def fetch_day(day):
+            api_rows = fetch_page_query_rows(client, config, None, day, day, page_filter=page_filter)
+            streams = demultiplex_rows(api_rows, url_filters)
+            return sum(
+                warehouse.store_day(client.site_url, url_filter, day, streams[url_filter])
+                for url_filter in url_filters
+            )
+
+        stored_rows = client.map(lambda day: _without_response_cache(fetch_day, day), missing)
+        return len(missing), sum(stored_rows)
 
+    memo_key = ("warehouse", start_date, end_date, tuple(url_filters))
+    return client.sweep_memo.get_or_compute(memo_key, sync)
 
-def save_output(rows, config, mode, city_mapping):
+
+def fetch_sweep_rows(client, config, url_filter, start_date, end_date, lang_label):
+    cross_language = uses_cross_language_sweep(config)
+    if get_fetch_strategy(config) != "warehouse":
+        if cross_language:
+            return iter(fetch_cross_language_rows(client, config, start_date, end_date)[url_filter])
+        return fetch_page_query_rows(client, config, url_filter, start_date, end_date)
+
+    warehouse = client.get_warehouse()
+    if cross_language:
+        fetched_days, stored_rows = sync_warehouse_cross_language(
+            client, config, warehouse, start_date, end_date
+        )
+    else:
+        fetched_days, stored_rows = sync_warehouse(
+            client, config, warehouse, url_filter, start_date, end_date
+        )
+    print(
+        f"[{lang_label}]   -> Warehouse: fetched {fetched_days} day(s), {stored_rows} rows"
+    )
+    return warehouse.iter_window_rows(client.site_url, url_filter, start_date, end_date)
+
+
+def build_sweep_index(api_rows):
+    pages = {}
+    queries = {}
+    page_queries = {}
+    query_pages = {}
+    row_count = 0
+
+    for row in api_rows:
+        row_count += 1
+        page_url, query_text = row["keys"][0], row["keys"][1]
+        metrics = {
+            "clicks": row["clicks"],
+            "impressions": row["impressions"],
+            "ctr": row["ctr"],
+            "position": row["position"],
+        }
+
+        page_queries.setdefault(page_url, []).append(dict(metrics, query=query_text))
+        query_pages.setdefault(query_text, []).append(dict(metrics, page=page_url))
+
+        if page_url not in pages:
+            pages[page_url] = _empty_metrics("page", page_url)
+        _add_metrics(pages[page_url], row)
+
+        if query_text not in queries:
+            queries[query_text] = _empty_metrics("query", query_text)
+        _add_metrics(queries[query_text], row)
+
+    for aggregated in list(pages.values()) + list(queries.values()):
+        _finalize_metrics(aggregated)
+
+    return {
+        "row_count": row_count,
+        "pages": pages,
+        "queries": queries,
+        "page_queries": page_queries,
+        "query_pages": query_pages,
+    }
+
+
+def get_mode_output_layout(config, mode):
+    # Only page_wise rows share page metrics; query_wise rows carry seed query
+    # metrics per (seed, page) pair, so they always use the flat layout.
+    layout = get_output_layout(config)
+    return layout if mode == "page_wise" else "flat"
+
+
+def save_output(rows, config, mode, city_mapping, query_taggers=()):
     output_cfg = config.get("output", {})
     directory = get_output_directory(config)
     prefix = output_cfg.get("prefix", "top_kws")
-    delimiter = output_cfg.get("csv_delimiter", ",")
-    encoding = output_cfg.get("csv_encoding", "utf-8")
     include_ts = output_cfg.get("include_timestamp", True)
     days = config.get("date_range", {}).get("days", 7)
     sort_by, _ = get_mode_sorting(config)
+    output_format = get_output_format(config)
+    layout = get_mode_output_layout(config, mode)
 
     ts = datetime.now().strftime("%Y%m%d_%H%M%S") if include_ts else ""
     parts = [prefix, mode, sort_by, f"{days}days"]
     if ts:
         parts.append(ts)
-    filename = "_".join(parts) + ".csv"
+    filename = build_output_filename("_".join(parts), output_format, layout)
     path = os.path.join(directory, filename)
 
-    headers = [
-        "mode",
-        "language",
-        "id",
-        "country",
-        "city",
-        "source_query",
-        "source_page",
-        "query",
-        "clicks",
-        "impressions",
-        "ctr",
-        "position",
-    ]
+    flush_every = max(1, int(output_cfg.get("flush_every", 100) or 1))
 
-    with open(path, "w", encoding=encoding, newline="") as f:
-        writer = csv.writer(f, delimiter=delimiter)
-        writer.writerow(headers)
+    written = 0
+    extra_columns = [column for column, _ in query_taggers]
+    sink = open_output_sink(path, output_format, output_cfg, layout, extra_columns)
+    try:
         for row in rows:
+            written += 1
             city_details = resolve_city_details(row.get("source_page", ""), city_mapping)
-            writer.writerow(
-                [
-                    row["mode"],
-                    row["language"],
-                    city_details["id"],
-                    city_details["country"],
-                    city_details["city"],
-                    row["source_query"],
-                    row["source_page"],
-                    row["query"],
-                    row["clicks"],
-                    row["impressions"],
-                    row["ctr"],
-                    row["position"],
-                ]
+            record = dict(
+                row,
+                id=city_details["id"],
+                country=city_details["country"],
+                city=city_details["city"],
             )
+            for column, tag_query in query_taggers:
+                record[column] = tag_query(row["query"])
+            sink.write(record)
+            if written % flush_every == 0:
+                sink.flush()
+    finally:
+        sink.close()
+
+    return path, written
+
+
+def _imap_serial(fn, items):
+    for item in items:
+        yield fn(item)
+
+
+class RowSpool:
+    # Rows from a language that is not yet being written are spooled to a temp file
+    # as JSON lines, so parallel languages do not pile up in memory.
+
+    def __init__(self, cancel=None):
+        self._cancel = cancel
+        self._file = tempfile.TemporaryFile()
+        self._size = 0
+        self._done = False
+        self._error = None
+        self._condition = threading.Condition()
+
+    def write(self, row):
+        line = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._condition:
+            if self._file.closed:
+                raise CollectionCancelled("Row spool was closed.")
+            self._file.seek(self._size)
+            self._file.write(line)
+            self._size += len(line)
+            self._condition.notify_all()
+
+    def finish(self, error=None):
+        with self._condition:
+            self._done = True
+            self._error = error
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._file.close()
+
+    def __iter__(self):
+        position = 0
+        drained = False
+        try:
+            while True:
+                with self._condition:
+                    while position >= self._size and not self._done:
+                        self._condition.wait()
+                    if position >= self._size:
+                        drained = self._error is None
+                        break
+                    self._file.seek(position)
+                    chunk = self._file.read(self._size - position)
+                position += len(chunk)
+                for line in chunk.split(b"\n"):
+                    if line:
+                        yield json.loads(line)
+        finally:
+            # A failed language or a consumer that stopped early ends the run, so
+            # the other languages stop spending quota on it.
+            if not drained and self._cancel is not None:
+                self._cancel.set()
+            self.close()
+
+        if self._error is not None:
+            raise self._error
+
+
+def get_parallel_languages(config):
+    concurrency_cfg = config.get("concurrency") or {}
+    return bool(concurrency_cfg.get("parallel_languages", True))
+
+
+def _timed_language_rows(collect_language, client, config, lang_id, start_date, end_date, regex_pattern):
+    lang_label = lang_id if lang_id else "bn"
+    started = time.monotonic()
+    count = 0
+    for row in collect_language(client, config, lang_id, start_date, end_date, regex_pattern):
+        count += 1
+        yield row
+    elapsed = time.monotonic() - started
+    client.language_timings.append((lang_label, count, elapsed))
+    client.progress.language_done(lang_label, count)
+    print(f"[{lang_label}] Finished: {count} rows in {elapsed:.1f}s")
+
+
+def collect_languages(client, config, collect_language, start_date, end_date, regex_pattern):
+    language_ids = get_language_ids(config)
+    if len(language_ids) <= 1 or not get_parallel_languages(config):
+        for lang_id in language_ids:
+            yield from _timed_language_rows(
+                collect_language, client, config, lang_id, start_date, end_date, regex_pattern
+            )
+        return
+
+    errors = []
+
+    def run_language(lang_id, spool):
+        try:
+            for row in _timed_language_rows(
+                collect_language, client, config, lang_id, start_date, end_date, regex_pattern
+            ):
+                spool.write(row)
+        except Exception as exc:
+            # Languages cancelled because of another one's failure report that failure.
+            if not isinstance(exc, CollectionCancelled):
+                errors.append(exc)
+            client.cancelled.set()
+            spool.finish(errors[0] if errors else exc)
+        else:
+            spool.finish()
 
-    return path
+    spools = [RowSpool(client.cancelled) for _ in language_ids]
+    executor = ThreadPoolExecutor(max_workers=len(language_ids), thread_name_prefix="language")
+    completed = False
+    try:
+        for lang_id, spool in zip(language_ids, spools):
+            executor.submit(contextvars.copy_context().run, run_language, lang_id, spool)
+
+        # Languages run concurrently but are merged in configured order.
+        for spool in spools:
+            yield from spool
+        completed = True
+    finally:
+        # Stopping early also stops the languages whose rows were never read,
+        # and their temp files are closed before waiting for the workers.
+        if not completed:
+            client.cancelled.set()
+        for spool in spools:
+            spool.close()
+        executor.shutdown(wait=True)
+
+
+def collect_query_wise(client, config, start_date, end_date, regex_pattern):
+    if client.budget is not None:
+        return collect_within_budget(
+            client, config, plan_query_wise_language, start_date, end_date, regex_pattern
+        )
+    return collect_languages(
+        client, config, collect_query_wise_language, start_date, end_date, regex_pattern
+    )
+
+
+def _query_wise_rows(lang_label, seed, page, page_queries):
+    return [
+        {
+            "mode": "query_wise",
+            "language": lang_label,
+            "source_query": seed["query"],
+            "source_page": page["page"],
+            "query": q["query"],
+            "clicks": seed["clicks"],
+            "impressions": seed["impressions"],
+            "ctr": seed["ctr"],
+            "position": seed["position"],
+        }
+        for q in page_queries
+    ]
+
+
+def _page_wise_rows(lang_label, page, page_queries):
+    return [
+        {
+            "mode": "page_wise",
+            "language": lang_label,
+            "source_query": "",
+            "source_page": page["page"],
+            "query": q["query"],
+            "clicks": page["clicks"],
+            "impressions": page["impressions"],
+            "ctr": page["ctr"],
+            "position": page["position"],
+            "query_clicks": q.get("clicks"),
+            "query_impressions": q.get("impressions"),
+            "query_ctr": q.get("ctr"),
+            "query_position": q.get("position"),
+        }
+        for q in page_queries
+    ]
+
+
+def _coverage_entry(lang_label, seed, page, priority, status, queries=0):
+    return {
+        "language": lang_label,
+        "source_query": seed["query"] if seed else "",
+        "page": page["page"] if page else "",
+        "priority": priority,
+        "status": status,
+        "queries": queries,
+    }
 
 
-def collect_query_wise(service, config, start_date, end_date, regex_pattern):
+def run_best_first(client, tasks, expand, on_skip):
+    # Anytime scheduler: always spends the next requests on the best-ranked
+    # queued task (lowest rank first) and never dispatches more tasks than the
+    # budget has requests left. expand(task) returns (rows, new_tasks) with
+    # new_tasks as (rank, task) pairs; tasks still queued when the budget runs
+    # out are passed to on_skip.
+    budget = client.budget
+    heap = []
+    sequence = count()
+    for rank, task in tasks:
+        heapq.heappush(heap, (rank, next(sequence), task))
+
+    while heap and budget.stop_reason() is None:
+        size = budget.reserve(min(client.workers, len(heap)))
+        if not size:
+            break
+        batch = [heapq.heappop(heap) for _ in range(size)]
+        try:
+            for rows, new_tasks in client.map(lambda entry: expand(entry[2]), batch):
+                yield from rows
+                for rank, task in new_tasks:
+                    heapq.heappush(heap, (rank, next(sequence), task))
+        finally:
+            budget.release(size)
+
+    for _, _, task in sorted(heap):
+        on_skip(task)
+
+
+def collect_within_budget(client, config, plan_language, start_date, end_date, regex_pattern):
+    # Under a budget every language is listed first and their tasks then share one
+    # best-first queue, so requests go to the best remaining work of any language
+    # rather than to whichever language lists first. plan_language returns the
+    # language's initial tasks with its expand and on_skip; rows are written in
+    # the order they are collected.
+    budget = client.budget
+    listed = []
+    # Listing requests count against the budget too. They are claimed in the
+    # configured order, so a budget smaller than the language count always
+    # skips the same languages.
+    for lang_id in get_language_ids(config):
+        if budget.reserve(1):
+            listed.append(lang_id)
+            continue
+        lang_label = lang_id if lang_id else "bn"
+        print(f"[{lang_label}]   -> Budget used up before listing")
+        client.coverage.append(_coverage_entry(lang_label, None, None, 0, "language_skipped"))
+
+    def plan_listed(lang_id):
+        try:
+            return plan_language(client, config, lang_id, start_date, end_date, regex_pattern)
+        finally:
+            budget.release(1)
+
+    started = time.monotonic()
+    if get_parallel_languages(config):
+        plans = client.map(plan_listed, listed)
+    else:
+        plans = [plan_listed(lang_id) for lang_id in listed]
+
+    def expand(item):
+        plan, task = item
+        rows, new_tasks = plan["expand"](task)
+        return rows, [(rank, (plan, new_task)) for rank, new_task in new_tasks]
+
+    def on_skip(item):
+        plan, task = item
+        plan["on_skip"](task)
+
+    rows_by_language = {plan["lang_label"]: 0 for plan in plans}
+    tasks = [(rank, (plan, task)) for plan in plans for rank, task in plan["tasks"]]
+    for row in run_best_first(client, tasks, expand, on_skip):
+        rows_by_language[row["language"]] += 1
+        yield row
+
+    elapsed = time.monotonic() - started
+    for lang_label, rows in rows_by_language.items():
+        client.language_timings.append((lang_label, rows, elapsed))
+        client.progress.language_done(lang_label, rows)
+        print(f"[{lang_label}] Finished: {rows} rows in {elapsed:.1f}s")
+
+
+def _query_wise_language(client, config, lang_id, start_date, end_date, regex_pattern):
+    # Lists one language's seed queries; returned with the functions that fetch
+    # a seed's pages and a page's queries.
     target_url = config["target_url"]
-    language_ids = get_language_ids(config)
     top_queries_count = config["display"].get("top_queries_count", 0)
+    sweep = uses_local_index(config)
+    seed_filter, page_query_filter = get_regex_pushdown(config, regex_pattern)
 
-    rows = []
-    for lang_id in language_ids:
-        lang_label = lang_id if lang_id else "bn"
-        url_filter = build_url_for_language(target_url, lang_id)
-        print(f"[{lang_label}] Collecting seed queries from: {url_filter}")
+    lang_label = lang_id if lang_id else "bn"
+    url_filter = build_url_for_language(target_url, lang_id)
+    print(f"[{lang_label}] Collecting seed queries from: {url_filter}")
 
+    if sweep:
+        index = build_sweep_index(
+            fetch_sweep_rows(client, config, url_filter, start_date, end_date, lang_label)
+        )
+        print(f"[{lang_label}]   -> Sweep rows: {index['row_count']}")
+        seed_queries = select_top_queries(list(index["queries"].values()), config)
+    else:
         seed_queries = get_top_queries_for_url(
-            service, config, url_filter, start_date, end_date
+            client, config, url_filter, start_date, end_date, query_filter=seed_filter
         )
+    if seed_filter is None:
         seed_queries = apply_regex_filter(seed_queries, regex_pattern)
-        if top_queries_count > 0:
-            seed_queries = seed_queries[:top_queries_count]
-        print(f"[{lang_label}]   -> Seed queries: {len(seed_queries)}")
+    if top_queries_count > 0:
+        seed_queries = islice(seed_queries, top_queries_count)
+    seed_queries = list(seed_queries)
+    print(f"[{lang_label}]   -> Seed queries: {len(seed_queries)}")
+
+    def fetch_pages(seed):
+        if sweep:
+            return select_pages_for_query(
+                list(index["query_pages"].get(seed["query"], [])), config
+            )
+        return get_pages_for_query(
+            client, config, seed["query"], url_filter, start_date, end_date
+        )
 
-        for seed in seed_queries:
-            pages = get_pages_for_query(
-                service, config, seed["query"], url_filter, start_date, end_date
+    def fetch_page_queries(item):
+        _, page = item
+        if sweep:
+            page_queries = select_queries_for_page(
+                list(index["page_queries"].get(page["page"], [])), config
             )
+        else:
+            page_queries = get_queries_for_page(
+                client, config, page["page"], start_date, end_date, query_filter=page_query_filter
+            )
+        if page_query_filter is not None:
+            return page_queries
+        return list(apply_regex_filter(page_queries, regex_pattern))
+
+    return {
+        "lang_label": lang_label,
+        "seed_queries": seed_queries,
+        "fetch_pages": fetch_pages,
+        "fetch_page_queries": fetch_page_queries,
+    }
+
+
+def collect_query_wise_language(client, config, lang_id, start_date, end_date, regex_pattern):
+    language = _query_wise_language(client, config, lang_id, start_date, end_date, regex_pattern)
+    lang_label = language["lang_label"]
+    seed_queries = language["seed_queries"]
+    fetch_pages = language["fetch_pages"]
+    fetch_page_queries = language["fetch_page_queries"]
+    run_imap = _imap_serial if uses_local_index(config) else client.imap
+
+    def iter_seed_pages():
+        for seed, pages in zip(seed_queries, run_imap(fetch_pages, seed_queries)):
             print(
                 f"[{lang_label}]   -> Pages for '{seed['query']}': {len(pages)}"
             )
-
+            client.progress.add_pages(lang_label, len(pages))
             for page in pages:
-                page_queries = get_queries_for_page(
-                    service, config, page["page"], start_date, end_date
-                )
-                page_queries = apply_regex_filter(page_queries, regex_pattern)
+                yield seed, page
+        client.progress.listing_done(lang_label)
+
+    for (seed, page), page_queries in run_imap(
+        lambda item: (item, fetch_page_queries(item)), iter_seed_pages()
+    ):
+        client.progress.page_done(lang_label)
+        yield from _query_wise_rows(lang_label, seed, page, page_queries)
+
+
+def plan_query_wise_language(client, config, lang_id, start_date, end_date, regex_pattern):
+    language = _query_wise_language(client, config, lang_id, start_date, end_date, regex_pattern)
+    lang_label = language["lang_label"]
+    fetch_pages = language["fetch_pages"]
+    fetch_page_queries = language["fetch_page_queries"]
+    priority = client.budget.priority
+
+    # Seeds are expanded best first and one at a time: expanding a seed queues
+    # its pages (best first) ahead of the next seed, and only then the next
+    # seed itself. A seed request only lists pages, so otherwise a small
+    # budget is spent listing seeds and no page is ever collected. Ranks start
+    # with the seed's value, so seeds and pages of other languages interleave
+    # by value.
+    seeds = sorted(language["seed_queries"], key=lambda seed: -seed[priority])
+
+    def seed_task(position):
+        return (-seeds[position][priority], position), ("seed", position, None)
+
+    def expand(task):
+        kind, position, page = task
+        seed = seeds[position]
+        if kind == "seed":
+            pages = fetch_pages(seed)
+            print(f"[{lang_label}]   -> Pages for '{seed['query']}': {len(pages)}")
+            client.progress.add_pages(lang_label, len(pages))
+            new_tasks = [
+                ((-seed[priority], position, -p[priority]), ("page", position, p)) for p in pages
+            ]
+            if position + 1 < len(seeds):
+                new_tasks.append(seed_task(position + 1))
+            return [], new_tasks
+        page_queries = fetch_page_queries((seed, page))
+        client.progress.page_done(lang_label)
+        client.coverage.append(
+            _coverage_entry(lang_label, seed, page, page[priority], "covered", len(page_queries))
+        )
+        return _query_wise_rows(lang_label, seed, page, page_queries), []
 
-                for q in page_queries:
-                    rows.append(
-                        {
-                            "mode": "query_wise",
-                            "language": lang_label,
-                            "source_query": seed["query"],
-                            "source_page": page["page"],
-                            "query": q["query"],
-                            "clicks": seed["clicks"],
-                            "impressions": seed["impressions"],
-                            "ctr": seed["ctr"],
-                            "position": seed["position"],
-                        }
-                    )
+    def on_skip(task):
+        kind, position, page = task
+        if kind == "page":
+            seed = seeds[position]
+            client.coverage.append(_coverage_entry(lang_label, seed, page, page[priority], "skipped"))
+            return
+        for seed in seeds[position:]:
+            client.coverage.append(_coverage_entry(lang_label, seed, None, seed[priority], "seed_skipped"))
 
-    return rows
+    return {
+        "lang_label": lang_label,
+        "tasks": [seed_task(0)] if seeds else [],
+        "expand": expand,
+        "on_skip": on_skip,
+    }
 
 
-def collect_page_wise(service, config, start_date, end_date, regex_pattern):
-    target_url = config["target_url"]
-    language_ids = get_language_ids(config)
+def collect_page_wise(client, config, start_date, end_date, regex_pattern):
+    if client.budget is not None:
+        return collect_within_budget(
+            client, config, plan_page_wise_language, start_date, end_date, regex_pattern
+        )
+    return collect_languages(
+        client, config, collect_page_wise_language, start_date, end_date, regex_pattern
+    )
 
-    rows = []
-    for lang_id in language_ids:
-        lang_label = lang_id if lang_id else "bn"
-        url_filter = build_url_for_language(target_url, lang_id)
-        print(f"[{lang_label}] Collecting pages from: {url_filter}")
 
-        pages = get_top_pages_for_url(service, config, url_filter, start_date, end_date)
-        print(f"[{lang_label}]   -> Pages selected: {len(pages)}")
+def _page_wise_language(client, config, lang_id, start_date, end_date, regex_pattern):
+    # Lists one language's pages; returned with the function that fetches a
+    # page's queries.
+    target_url = config["target_url"]
+    sweep = uses_local_index(config)
+    _, page_query_filter = get_regex_pushdown(config, regex_pattern)
+
+    lang_label = lang_id if lang_id else "bn"
+    url_filter = build_url_for_language(target_url, lang_id)
+    print(f"[{lang_label}] Collecting pages from: {url_filter}")
 
-        for page in pages:
+    if sweep:
+        index = build_sweep_index(
+            fetch_sweep_rows(client, config, url_filter, start_date, end_date, lang_label)
+        )
+        print(f"[{lang_label}]   -> Sweep rows: {index['row_count']}")
+        pages = select_top_pages(list(index["pages"].values()), config)
+    else:
+        pages = get_top_pages_for_url(client, config, url_filter, start_date, end_date)
+    print(f"[{lang_label}]   -> Pages selected: {len(pages)}")
+    client.progress.add_pages(lang_label, len(pages), listed=True)
+
+    def fetch_page_queries(page):
+        if sweep:
+            page_queries = select_queries_for_page(
+                list(index["page_queries"].get(page["page"], [])), config
+            )
+        else:
             page_queries = get_queries_for_page(
-                service,
+                client,
                 config,
                 page["page"],
                 start_date,
                 end_date,
+                query_filter=page_query_filter,
             )
-            page_queries = apply_regex_filter(page_queries, regex_pattern)
-            print(
-                f"[{lang_label}]   -> Queries for '{page['page']}': {len(page_queries)}"
-            )
+        if page_query_filter is not None:
+            return page_queries
+        return list(apply_regex_filter(page_queries, regex_pattern))
+
+    return {"lang_label": lang_label, "pages": pages, "fetch_page_queries": fetch_page_queries}
+
+
+def collect_page_wise_language(client, config, lang_id, start_date, end_date, regex_pattern):
+    language = _page_wise_language(client, config, lang_id, start_date, end_date, regex_pattern)
+    lang_label = language["lang_label"]
+    pages = language["pages"]
+    run_imap = _imap_serial if uses_local_index(config) else client.imap
+
+    for page, page_queries in zip(pages, run_imap(language["fetch_page_queries"], pages)):
+        print(
+            f"[{lang_label}]   -> Queries for '{page['page']}': {len(page_queries)}"
+        )
+        client.progress.page_done(lang_label)
+        yield from _page_wise_rows(lang_label, page, page_queries)
+
+
+def plan_page_wise_language(client, config, lang_id, start_date, end_date, regex_pattern):
+    language = _page_wise_language(client, config, lang_id, start_date, end_date, regex_pattern)
+    lang_label = language["lang_label"]
+    fetch_page_queries = language["fetch_page_queries"]
+    priority = client.budget.priority
+
+    def expand(page):
+        page_queries = fetch_page_queries(page)
+        print(f"[{lang_label}]   -> Queries for '{page['page']}': {len(page_queries)}")
+        client.progress.page_done(lang_label)
+        client.coverage.append(
+            _coverage_entry(lang_label, None, page, page[priority], "covered", len(page_queries))
+        )
+        return _page_wise_rows(lang_label, page, page_queries), []
+
+    def on_skip(page):
+        client.coverage.append(_coverage_entry(lang_label, None, page, page[priority], "skipped"))
+
+    return {
+        "lang_label": lang_label,
+        "tasks": [(-page[priority], page) for page in language["pages"]],
+        "expand": expand,
+        "on_skip": on_skip,
+    }
+
+
+def get_planner_settings(config):
+    planner_cfg = config.get("planner") or {}
+    on_exceed = str(planner_cfg.get("on_exceed", "warn")).strip().lower()
+    return {
+        "max_requests": int(planner_cfg.get("max_requests", 0) or 0),
+        "on_exceed": on_exceed if on_exceed in {"warn", "refuse"} else "warn",
+        "assumed_list_rows": int(planner_cfg.get("assumed_list_rows", 200) or 1),
+        "assumed_sweep_rows": int(planner_cfg.get("assumed_sweep_rows", 50000) or 1),
+    }
+
 
-            for q in page_queries:
-                rows.append(
-                    {
-                        "mode": "page_wise",
-                        "language": lang_label,
-                        "source_query": "",
-                        "source_page": page["page"],
-                        "query": q["query"],
-                        "clicks": page["clicks"],
-                        "impressions": page["impressions"],
-                        "ctr": page["ctr"],
-                        "position": page["position"],
-                    }
+def _planned_list_calls(rows, row_limit, shards=1):
+    # Pagination stops at the first short page, so N rows cost N // page_size + 1 calls.
+    page_size = min(row_limit, GSC_MAX_ROW_LIMIT) if row_limit else GSC_MAX_ROW_LIMIT
+    return shards * (rows // page_size + 1)
+
+
+def _planned_missing_days(config, url_filters, start_date, end_date):
+    path = resolve_warehouse_path(config.get("warehouse") or {})
+    if not os.path.exists(path):
+        return len(list(iter_days(start_date, end_date)))
+    warehouse = Warehouse.from_config(config)
+    try:
+        missing = set()
+        for url_filter in url_filters:
+            missing.update(warehouse.missing_days(config["site_url"], url_filter, start_date, end_date))
+    finally:
+        warehouse.close()
+    return len(missing)
+
+
+def plan_requests(config, start_date, end_date):
+    # Estimates searchanalytics calls from config alone. Lists whose display
+    # limit is 0 are assumed to return planner.assumed_list_rows rows; cache
+    # hits and page memo hits are not subtracted, so the total is an upper bound.
+    settings = get_planner_settings(config)
+    display = config.get("display") or {}
+    row_limit = config["api"]["row_limit"]
+    strategy = get_fetch_strategy(config)
+    mode = get_extraction_mode(config)
+    shard_days = get_shard_days(config)
+    shards = len(split_date_range(start_date, end_date, shard_days)) if shard_days else 1
+    assumed = settings["assumed_list_rows"]
+    stages = []
+
+    def add_stage(language, stage, calls, detail):
+        stages.append({"language": language, "stage": stage, "calls": calls, "detail": detail})
+
+    if uses_local_index(config):
+        url_filters = get_language_url_filters(config)
+        groups = [("all", url_filters)] if uses_cross_language_sweep(config) else [
+            (lang_id, [build_url_for_language(config["target_url"], lang_id)])
+            for lang_id in get_language_ids(config)
+        ]
+        for language, group_filters in groups:
+            if strategy == "warehouse":
+                days = _planned_missing_days(config, group_filters, start_date, end_date)
+                window_days = len(list(iter_days(start_date, end_date)))
+                rows_per_day = settings["assumed_sweep_rows"] // max(1, window_days)
+                add_stage(
+                    language,
+                    "warehouse days",
+                    days * _planned_list_calls(rows_per_day, row_limit),
+                    f"{days} missing day(s)",
                 )
+            else:
+                add_stage(
+                    language,
+                    "page x query sweep",
+                    _planned_list_calls(settings["assumed_sweep_rows"] * len(group_filters), row_limit, shards),
+                    f"{shards} shard(s)",
+                )
+    else:
+        range_cfg = config.get("range_filter") or {}
+        if range_cfg.get("enabled", False):
+            pages_per_seed = max(0, (range_cfg.get("end_row") or assumed) - max(1, range_cfg.get("start_row", 1)) + 1)
+        else:
+            pages_per_seed = display.get("pages_per_query", 0) or assumed
+        queries_per_page = display.get("queries_per_page", display.get("top_queries_count", 0)) or assumed
+
+        for lang_id in get_language_ids(config):
+            if mode == "query_wise":
+                seeds = display.get("top_queries_count", 0) or assumed
+                add_stage(lang_id, "seed queries", _planned_list_calls(seeds, row_limit, shards), f"{seeds} seed(s)")
+                add_stage(
+                    lang_id,
+                    "pages per seed",
+                    seeds * _planned_list_calls(pages_per_seed, row_limit, shards),
+                    f"{seeds} x {pages_per_seed} page(s)",
+                )
+                page_count = seeds * pages_per_seed
+            else:
+                page_count = display.get("pages_per_query", 0) or assumed
+                add_stage(lang_id, "top pages", _planned_list_calls(page_count, row_limit, shards), f"{page_count} page(s)")
+            add_stage(
+                lang_id,
+                "queries per page",
+                page_count * _planned_list_calls(queries_per_page, row_limit, shards),
+                f"{page_count} page(s), at most",
+            )
 
-    return rows
+    total = sum(stage["calls"] for stage in stages)
+    concurrency_cfg = config.get("concurrency") or {}
+    rates = []
+    if concurrency_cfg.get("requests_per_second"):
+        rates.append(float(concurrency_cfg["requests_per_second"]))
+    if concurrency_cfg.get("requests_per_minute"):
+        rates.append(float(concurrency_cfg["requests_per_minute"]) / 60)
 
+    return {
+        "site_url": config["site_url"],
+        "mode": mode,
+        "fetch_strategy": strategy,
+        "date_range": [start_date, end_date],
+        "stages": stages,
+        "total_requests": total,
+        "estimated_seconds": round(total / min(rates), 1) if rates else None,
+        "max_requests": settings["max_requests"],
+        "on_exceed": settings["on_exceed"],
+        "over_budget": bool(settings["max_requests"]) and total > settings["max_requests"],
+    }
 
-def main():
-    configure_stdio()
-    config = load_config(CONFIG_FILE)
+
+def print_plan(plan):
+    print(f"Request plan   : {plan['site_url']} ({plan['mode']}, {plan['fetch_strategy']})")
+    for stage in plan["stages"]:
+        print(f"  [{stage['language']}] {stage['stage']:<20}: {stage['calls']} ({stage['detail']})")
+    duration = f", ~{plan['estimated_seconds']}s at the configured rate" if plan["estimated_seconds"] is not None else ""
+    print(f"  Total requests    : {plan['total_requests']} (upper bound, before cache hits{duration})")
+    if plan["max_requests"]:
+        print(f"  Budget            : {plan['max_requests']} ({'exceeded' if plan['over_budget'] else 'ok'})")
+
+
+def check_request_budget(plan):
+    if not plan["over_budget"]:
+        return
+    message = (
+        f"Planned {plan['total_requests']} requests exceed planner.max_requests "
+        f"({plan['max_requests']}) for {plan['site_url']}."
+    )
+    if plan["on_exceed"] == "refuse":
+        raise ValueError(f"{message} Refusing to run; raise the budget or narrow display limits.")
+    print(f"[WARNING] {message}")
+
+
+def run_collection(client, config):
     ensure_output_directory(config)
     get_output_directory(config)
 
@@ -666,36 +1982,263 @@ def main():
             "Invalid extraction_mode. Use one of: query_wise, page_wise"
         )
 
-    service = get_gsc_service(config)
     start_date, end_date = get_date_range(config)
     regex_pattern = build_regex_pattern(config)
     city_mapping = load_city_mapping(config)
+    city_matcher = load_query_city_matcher(config)
     sort_by, order = get_mode_sorting(config)
 
     print("=" * 60)
     print("Flexible GSC Collector")
     print("=" * 60)
+    print(f"Property       : {client.site_url} ({config['target_url']})")
     print(f"Mode           : {extraction_mode}")
+    print(f"Fetch strategy : {get_fetch_strategy(config)}{' (cross-language)' if uses_cross_language_sweep(config) else ''}")
+    print(f"Workers        : {client.workers} ({client.controller.describe()})")
+    print(f"Languages      : {', '.join(get_language_ids(config))} ({'parallel' if get_parallel_languages(config) else 'serial'})")
+    print(f"Date shards    : {get_shard_days(config) or 'off'}")
+    if city_matcher is not None:
+        print(f"City tagging   : {city_matcher.matcher.describe()}")
+    print(f"Output format  : {get_output_format(config)} ({get_mode_output_layout(config, extraction_mode)} layout)")
     print(f"Date range     : {start_date} -> {end_date}")
     print(f"Sort           : {sort_by} ({order})")
+    if regex_pattern is not None:
+        seed_filter, page_query_filter = get_regex_pushdown(config, regex_pattern)
+        if extraction_mode == "page_wise":
+            seed_filter = None
+        pushed = [
+            label
+            for label, pushed_filter in (("seed queries", seed_filter), ("page queries", page_query_filter))
+            if pushed_filter is not None
+        ]
+        print(f"Regex filter   : {'includingRegex for ' + ', '.join(pushed) if pushed else 'client-side'}")
+        if isinstance(regex_pattern, KeywordMatcher):
+            print(f"Keyword match  : {regex_pattern.describe()}")
     print(f"Top queries    : {config['display'].get('top_queries_count', 0) or 'all'}")
     print(f"Pages/query    : {config['display'].get('pages_per_query', 0) or 'all'}")
     print(f"Queries/page   : {config['display'].get('queries_per_page', config['display'].get('top_queries_count', 0)) or 'all'}")
+    client.budget = RequestBudget.from_config(config, client.controller)
+    client.coverage = []
+    client.cancelled = threading.Event()
+    if client.budget is not None:
+        if uses_local_index(config):
+            print("[WARNING] budget applies to the per_request fetch strategy only; ignoring it.")
+            client.budget = None
+        else:
+            print(f"Budget         : {client.budget.describe()}")
+            if get_shard_days(config):
+                # A sharded fetch costs one request per shard, which the budget
+                # cannot see when it hands out requests.
+                print("[WARNING] api.shard_days is ignored while a budget is enabled.")
+                config = dict(config, api=dict(config["api"], shard_days=0))
+    plan = plan_requests(config, start_date, end_date)
+    print_plan(plan)
     print()
-
+    check_request_budget(plan)
+
+    requests_before = client.controller.requests
+    started = time.monotonic()
+    planned_requests = plan["total_requests"]
+    if client.budget is not None and client.budget.max_requests:
+        planned_requests = min(planned_requests, client.budget.max_requests)
+    client.progress.start(
+        client.controller,
+        planned_requests,
+        [lang_id if lang_id else "bn" for lang_id in get_language_ids(config)],
+    )
     if extraction_mode == "query_wise":
-        rows = collect_query_wise(service, config, start_date, end_date, regex_pattern)
+        rows = collect_query_wise(client, config, start_date, end_date, regex_pattern)
     else:
-        rows = collect_page_wise(service, config, start_date, end_date, regex_pattern)
-
-    output_path = save_output(rows, config, extraction_mode, city_mapping)
+        rows = collect_page_wise(client, config, start_date, end_date, regex_pattern)
+
+    output_path, row_count = save_output(
+        client.progress.track_rows(rows),
+        config,
+        extraction_mode,
+        city_mapping,
+        get_query_taggers(config, regex_pattern, city_matcher),
+    )
+    coverage_path = None
+    if client.budget is not None:
+        coverage_path = write_coverage(output_path, client.coverage, config.get("output", {}))
 
     print("\n" + "=" * 60)
     print("Summary")
     print("=" * 60)
-    print(f"Rows collected : {len(rows)}")
+    print(f"Rows collected : {row_count}")
+    print(f"API requests   : {client.controller.summary()}")
+    print(f"Page memo      : {client.page_queries_memo.describe()}")
+    for lang_label, lang_rows, elapsed in client.language_timings:
+        print(f"Language {lang_label:<6}: {lang_rows} rows in {elapsed:.1f}s")
+    if client.cache is not None:
+        print(f"Response cache : {client.cache.describe()}")
+    if client.budget is not None:
+        covered = sum(1 for entry in client.coverage if entry["status"] == "covered")
+        pages = sum(1 for entry in client.coverage if entry["status"] in {"covered", "skipped"})
+        complete = all(entry["status"] == "covered" for entry in client.coverage)
+        # Cached responses are not requests, so a stop can leave the limit unmet.
+        stop_reason = client.budget.stop_reason() or "request limit"
+        print(
+            f"Budget         : {client.budget.used()} requests used, {covered}/{pages} pages covered"
+            f" ({'completed' if complete else 'stopped at ' + stop_reason})"
+        )
+        print(f"Coverage file  : {coverage_path}")
     print(f"Output file    : {output_path}")
 
+    return {
+        "site_url": client.site_url,
+        "target_url": config["target_url"],
+        "mode": extraction_mode,
+        "rows": row_count,
+        "requests": client.controller.requests - requests_before,
+        "elapsed_seconds": round(time.monotonic() - started, 1),
+        "output_file": output_path,
+        "coverage_file": coverage_path,
+    }
+
+
+def collect(config, progress=None):
+    client = GscClient(config)
+    if progress is not None:
+        client.progress = progress
+    try:
+        return run_collection(client, config)
+    finally:
+        client.close()
+
+
+def _merge_config(base, overrides):
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge_config(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def get_batch_configs(config):
+    # Each batch.properties entry overrides the base config; its name keeps the
+    # output files of different properties apart.
+    properties = (config.get("batch") or {}).get("properties") or []
+    base = {key: value for key, value in config.items() if key != "batch"}
+    base_prefix = (base.get("output") or {}).get("prefix", "top_kws")
+
+    batch_configs = []
+    for entry in properties:
+        entry = dict(entry or {})
+        name = str(entry.pop("name", "") or "").strip()
+        merged = _merge_config(base, entry)
+        name = normalize_slug(name or urlparse(merged["target_url"]).netloc or merged["site_url"])
+        if not (entry.get("output") or {}).get("prefix"):
+            merged.setdefault("output", {})["prefix"] = f"{base_prefix}_{name}"
+        batch_configs.append((name, merged))
+    return batch_configs
+
+
+def write_batch_report(config, results):
+    directory = get_output_directory(config)
+    prefix = (config.get("output") or {}).get("prefix", "top_kws")
+    path = os.path.join(directory, f"{prefix}_batch_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def run_batch(config, client=None):
+    batch_configs = get_batch_configs(config)
+    if not batch_configs:
+        raise ValueError("Batch mode needs at least one entry in batch.properties.")
+
+    root = client or GscClient(config)
+    results = []
+    try:
+        for name, property_config in batch_configs:
+            print(f"\n### [{name}] {property_config['site_url']}\n")
+            try:
+                result = run_collection(root.for_property(property_config), property_config)
+            except Exception as exc:
+                print(f"[ERROR] [{name}] {exc}")
+                result = {
+                    "site_url": property_config["site_url"],
+                    "target_url": property_config["target_url"],
+                    "error": str(exc),
+                }
+            results.append(dict(result, name=name))
+    finally:
+        root.close()
+
+    print("\n" + "=" * 60)
+    print("Batch Summary")
+    print("=" * 60)
+    for result in results:
+        if "error" in result:
+            print(f"{result['name']:<20}: FAILED ({result['error']})")
+        else:
+            print(
+                f"{result['name']:<20}: {result['rows']} rows, {result['requests']} requests, "
+                f"{result['elapsed_seconds']}s -> {result['output_file']}"
+            )
+    print(f"API requests   : {root.controller.summary()}")
+    if root.cache is not None:
+        print(f"Response cache : {root.cache.describe()}")
+    print(f"Batch report   : {write_batch_report(config, results)}")
+    return results
+
+
+def dry_run(config, batch=False):
+    configs = [config_item for _, config_item in get_batch_configs(config)] if batch else [config]
+    plans = []
+    for property_config in configs:
+        start_date, end_date = get_date_range(property_config)
+        plan = plan_requests(property_config, start_date, end_date)
+        print_plan(plan)
+        print()
+        plans.append(plan)
+    if batch:
+        print(f"Batch total    : {sum(plan['total_requests'] for plan in plans)} requests")
+    return plans
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Collect Search Console query data.")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Run every property in batch.properties in one process",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the estimated request plan without calling the API",
+    )
+    parser.add_argument(
+        "-c",
+        "--config",
+        dest="config_path",
+        default=CONFIG_FILE,
+        help="Path to config YAML file (optional)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    configure_stdio()
+    args = parse_args()
+    config = load_config(args.config_path)
+
+    if args.dry_run:
+        dry_run(config, batch=args.batch)
+        return
+
+    if args.batch:
+        results = run_batch(config)
+        if any("error" in result for result in results):
+            sys.exit(1)
+        return
+
+    collect(config)
+
 
 if __name__ == "__main__":
     main()
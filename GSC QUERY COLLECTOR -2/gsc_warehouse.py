@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+DEFAULT_WAREHOUSE_PATH = "gsc_warehouse.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_metrics (
+    site_url TEXT NOT NULL,
+    url_filter TEXT NOT NULL,
+    date TEXT NOT NULL,
+    page TEXT NOT NULL,
+    query TEXT NOT NULL,
+    clicks INTEGER NOT NULL,
+    impressions INTEGER NOT NULL,
+    ctr REAL NOT NULL,
+    position REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_daily_metrics_window
+    ON daily_metrics (site_url, url_filter, date);
+CREATE TABLE IF NOT EXISTS fetched_days (
+    site_url TEXT NOT NULL,
+    url_filter TEXT NOT NULL,
+    date TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    is_final INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (site_url, url_filter, date)
+);
+"""
+
+
+def resolve_warehouse_path(warehouse_cfg):
+    configured = warehouse_cfg.get("path") or DEFAULT_WAREHOUSE_PATH
+    if os.path.isabs(configured):
+        return configured
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, configured)
+
+
+def iter_days(start_date, end_date):
+    day = datetime.strptime(start_date, "%Y-%m-%d").date()
+    last = datetime.strptime(end_date, "%Y-%m-%d").date()
+    while day <= last:
+        yield day.strftime("%Y-%m-%d")
+        day += timedelta(days=1)
+
+
+class Warehouse:
+    def __init__(self, path, final_after_days=3):
+        self.path = path
+        self.final_after_days = final_after_days
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config):
+        warehouse_cfg = config.get("warehouse") or {}
+        return cls(
+            resolve_warehouse_path(warehouse_cfg),
+            final_after_days=int(warehouse_cfg.get("final_after_days", 3)),
+        )
+
+    def is_final_day(self, day, today=None):
+        today = today or datetime.now().date()
+        value = datetime.strptime(day, "%Y-%m-%d").date()
+        return value <= today - timedelta(days=self.final_after_days)
+
+    def missing_days(self, site_url, url_filter, start_date, end_date):
+        with self._lock:
+            stored = dict(
+                self._conn.execute(
+                    "SELECT date, is_final FROM fetched_days "
+                    "WHERE site_url = ? AND url_filter = ? AND date BETWEEN ? AND ?",
+                    (site_url, url_filter, start_date, end_date),
+                ).fetchall()
+            )
+        return [day for day in iter_days(start_date, end_date) if not stored.get(day)]
+
+    def store_day(self, site_url, url_filter, day, api_rows):
+        records = [
+            (
+                site_url,
+                url_filter,
+                day,
+                row["keys"][0],
+                row["keys"][1],
+                row["clicks"],
+                row["impressions"],
+                row["ctr"],
+                row["position"],
+            )
+            for row in api_rows
+        ]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM daily_metrics WHERE site_url = ? AND url_filter = ? AND date = ?",
+                (site_url, url_filter, day),
+            )
+            self._conn.executemany(
+                "INSERT INTO daily_metrics "
+                "(site_url, url_filter, date, page, query, clicks, impressions, ctr, position) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records,
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fetched_days "
+                "(site_url, url_filter, date, row_count, is_final, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    site_url,
+                    url_filter,
+                    day,
+                    len(records),
+                    int(self.is_final_day(day)),
+                    time.time(),
+                ),
+            )
+        return len(records)
+
+    def iter_window_rows(self, site_url, url_filter, start_date, end_date):
+        # Same aggregation as final_format.convert_csv: sums for clicks and
+        # impressions, impression-weighted position, simple mean as fallback.
+        with self._lock:
+            records = self._conn.execute(
+                "SELECT page, query, SUM(clicks), SUM(impressions), "
+                "SUM(position * impressions), SUM(position), COUNT(*), AVG(ctr) "
+                "FROM daily_metrics "
+                "WHERE site_url = ? AND url_filter = ? AND date BETWEEN ? AND ? "
+                "GROUP BY page, query ORDER BY SUM(clicks) DESC",
+                (site_url, url_filter, start_date, end_date),
+            ).fetchall()
+
+        for page, query, clicks, impressions, weighted, simple, count, avg_ctr in records:
+            if impressions > 0:
+                ctr = clicks / impressions
+                position = weighted / impressions
+            else:
+                ctr = avg_ctr
+                position = simple / count
+            yield {
+                "keys": [page, query],
+                "clicks": clicks,
+                "impressions": impressions,
+                "ctr": ctr,
+                "position": position,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
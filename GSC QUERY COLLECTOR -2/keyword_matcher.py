@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import re
+import unicodedata
+from collections import deque
+
+
+def normalize_text(value):
+    return unicodedata.normalize("NFKC", value or "").casefold()
+
+
+def is_pushdown_safe(keyword):
+    return keyword.isascii() and normalize_text(keyword) == keyword.lower()
+
+
+class KeywordMatcher:
+    # Aho-Corasick automaton over the normalized keywords: one pass over the
+    # text finds every keyword, however many there are.
+
+    def __init__(self, keywords, whole_words=False):
+        self.keywords = [kw for kw in dict.fromkeys(k.strip() for k in keywords) if kw]
+        self.whole_words = whole_words
+        # Escaped alternation kept for GSC includingRegex pushdown and display.
+        self.pattern = "|".join(re.escape(kw) for kw in self.keywords)
+        # GSC matches the raw query with (?i) only, so the pattern is pushed down
+        # only when that agrees with the NFKC + casefold matching done here. Only
+        # the keywords can be checked: a query written in compatibility forms
+        # (full-width "ｐｒａｙｅｒ", ligatures, math letters) still matches
+        # locally but is dropped by GSC. Set query_regex.pushdown: false where
+        # such queries matter.
+        self.pushdown_safe = all(is_pushdown_safe(kw) for kw in self.keywords)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        self._lengths = []
+        for keyword_id, keyword in enumerate(self.keywords):
+            normalized = normalize_text(keyword)
+            self._lengths.append(len(normalized))
+            self._add(normalized, keyword_id)
+        self._link()
+
+    def _add(self, text, keyword_id):
+        if not text:
+            return
+        state = 0
+        for ch in text:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][ch] = next_state
+            state = next_state
+        self._output[state] += (keyword_id,)
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(ch, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def _iter_outputs(self, text):
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        text = normalize_text(text)
+        state = 0
+        for end, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not output[state]:
+                continue
+            if not self.whole_words:
+                yield end, output[state]
+                continue
+            if end + 1 < len(text) and text[end + 1].isalnum():
+                continue
+            keyword_ids = tuple(
+                keyword_id
+                for keyword_id in output[state]
+                if end + 1 == self._lengths[keyword_id]
+                or not text[end - self._lengths[keyword_id]].isalnum()
+            )
+            if keyword_ids:
+                yield end, keyword_ids
+
+    def search(self, text):
+        for _ in self._iter_outputs(text):
+            return True
+        return False
+
+    def find_all(self, text):
+        matched = {}
+        for _, keyword_ids in self._iter_outputs(text):
+            for keyword_id in keyword_ids:
+                matched.setdefault(keyword_id, None)
+        return [self.keywords[keyword_id] for keyword_id in matched]
+
+    def find_spans(self, text):
+        # (start, end, keyword) for every match; positions index the normalized text.
+        return [
+            (end + 1 - self._lengths[keyword_id], end + 1, self.keywords[keyword_id])
+            for end, keyword_ids in self._iter_outputs(text)
+            for keyword_id in keyword_ids
+        ]
+
+    def describe(self):
+        return f"{len(self.keywords)} keywords, {len(self._goto)} states"
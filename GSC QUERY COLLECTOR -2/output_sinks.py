@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+
+import csv
+import os
+import sqlite3
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+RESULTS_TABLE = {
+    "name": "results",
+    "columns": [
+        ("mode", "text"),
+        ("language", "text"),
+        ("id", "text"),
+        ("country", "text"),
+        ("city", "text"),
+        ("source_query", "text"),
+        ("source_page", "text"),
+        ("query", "text"),
+        ("clicks", "real"),
+        ("impressions", "real"),
+        ("ctr", "real"),
+        ("position", "real"),
+    ],
+    "indexes": {
+        "idx_results_page": ("language", "source_page"),
+        "idx_results_query": ("query",),
+        "idx_results_location": ("country", "city"),
+    },
+}
+PAGES_TABLE = {
+    "name": "pages",
+    "columns": [
+        ("page_id", "int"),
+        ("mode", "text"),
+        ("language", "text"),
+        ("id", "text"),
+        ("country", "text"),
+        ("city", "text"),
+        ("page", "text"),
+        ("clicks", "real"),
+        ("impressions", "real"),
+        ("ctr", "real"),
+        ("position", "real"),
+    ],
+    "indexes": {
+        "idx_pages_page_id": ("page_id",),
+        "idx_pages_page": ("language", "page"),
+        "idx_pages_location": ("country", "city"),
+    },
+}
+PAGE_QUERIES_TABLE = {
+    "name": "page_queries",
+    "columns": [
+        ("page_id", "int"),
+        ("query", "text"),
+        ("clicks", "real"),
+        ("impressions", "real"),
+        ("ctr", "real"),
+        ("position", "real"),
+    ],
+    "indexes": {
+        "idx_page_queries_page_id": ("page_id",),
+        "idx_page_queries_query": ("query",),
+    },
+}
+COVERAGE_TABLE = {
+    "name": "coverage",
+    "columns": [
+        ("language", "text"),
+        ("source_query", "text"),
+        ("page", "text"),
+        ("priority", "real"),
+        ("status", "text"),
+        ("queries", "int"),
+    ],
+    "indexes": {},
+}
+OUTPUT_HEADERS = [name for name, _ in RESULTS_TABLE["columns"]]
+
+OUTPUT_EXTENSIONS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "sqlite": ".sqlite",
+}
+OUTPUT_LAYOUTS = {"flat", "normalized"}
+SQLITE_TYPES = {"text": "TEXT", "real": "REAL", "int": "INTEGER"}
+PAGES_SUFFIX = "_pages"
+PAGE_QUERIES_SUFFIX = "_page_queries"
+COVERAGE_SUFFIX = "_coverage"
+
+
+def get_output_format(config):
+    output_format = str((config.get("output") or {}).get("format", "csv")).strip().lower()
+    return output_format if output_format in OUTPUT_EXTENSIONS else "csv"
+
+
+def get_output_layout(config):
+    layout = str((config.get("output") or {}).get("layout", "flat")).strip().lower()
+    return layout if layout in OUTPUT_LAYOUTS else "flat"
+
+
+def build_output_filename(stem, output_format, layout="flat"):
+    # Normalized CSV/Parquet output is two files; the pages file is the one
+    # reported as the run output. SQLite keeps both tables in one file.
+    if layout == "normalized" and output_format != "sqlite":
+        stem += PAGES_SUFFIX
+    return stem + OUTPUT_EXTENSIONS[output_format]
+
+
+def extend_table(table, extra_columns):
+    if not extra_columns:
+        return table
+    extended = dict(table)
+    extended["columns"] = table["columns"] + [(name, "text") for name in extra_columns]
+    return extended
+
+
+def get_page_queries_path(pages_path):
+    if detect_output_format(pages_path) == "sqlite":
+        return pages_path
+    base, ext = os.path.splitext(pages_path)
+    if base.endswith(PAGES_SUFFIX):
+        base = base[: -len(PAGES_SUFFIX)]
+    return f"{base}{PAGE_QUERIES_SUFFIX}{ext}"
+
+
+def detect_output_format(path):
+    ext = os.path.splitext(str(path))[1].lower()
+    for output_format, output_ext in OUTPUT_EXTENSIONS.items():
+        if ext == output_ext:
+            return output_format
+    return "csv"
+
+
+def is_normalized_output(path):
+    path = str(path)
+    if detect_output_format(path) == "sqlite":
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            found = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (PAGES_TABLE["name"],),
+            ).fetchone()
+        finally:
+            conn.close()
+        return found is not None
+    base = os.path.splitext(path)[0]
+    return base.endswith(PAGES_SUFFIX) and os.path.exists(get_page_queries_path(path))
+
+
+def get_output_files(path):
+    # Every file that makes up one collector output.
+    path = str(path)
+    if is_normalized_output(path):
+        return sorted({path, get_page_queries_path(path)})
+    return [path]
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet output needs pyarrow. Install it with: pip install pyarrow")
+
+
+class CsvSink:
+    def __init__(self, path, output_cfg, table=RESULTS_TABLE):
+        self.names = [name for name, _ in table["columns"]]
+        self._handle = open(
+            path,
+            "w",
+            encoding=output_cfg.get("csv_encoding", "utf-8"),
+            newline="",
+        )
+        self._writer = csv.writer(self._handle, delimiter=output_cfg.get("csv_delimiter", ","))
+        self._writer.writerow(self.names)
+        self._handle.flush()
+
+    def write(self, record):
+        self._writer.writerow([record.get(name) for name in self.names])
+
+    def flush(self):
+        self._handle.flush()
+
+    def close(self):
+        self._handle.close()
+
+
+def _parquet_array(values, kind):
+    if kind == "text":
+        return pa.array(["" if value is None else str(value) for value in values], pa.string()).dictionary_encode()
+    if kind == "int":
+        return pa.array([int(value) for value in values], pa.int64())
+    return pa.array(
+        [None if value is None or value == "" else float(value) for value in values],
+        pa.float64(),
+    )
+
+
+class ParquetSink:
+    # String columns are dictionary-encoded, so page URLs, countries and cities
+    # repeated across query rows are stored once per row group.
+
+    def __init__(self, path, output_cfg, table=RESULTS_TABLE):
+        require_pyarrow()
+        self.columns = table["columns"]
+        self.row_group_size = max(1, int(output_cfg.get("parquet_row_group_size", 50000) or 1))
+        parquet_types = {
+            "text": pa.dictionary(pa.int32(), pa.string()),
+            "real": pa.float64(),
+            "int": pa.int64(),
+        }
+        self.schema = pa.schema([(name, parquet_types[kind]) for name, kind in self.columns])
+        self._writer = pq.ParquetWriter(
+            path,
+            self.schema,
+            use_dictionary=[name for name, kind in self.columns if kind == "text"],
+            compression=output_cfg.get("parquet_compression", "zstd"),
+        )
+        self._buffer = []
+
+    def write(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self):
+        if not self._buffer:
+            return
+        arrays = [
+            _parquet_array([record.get(name) for record in self._buffer], kind)
+            for name, kind in self.columns
+        ]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self._buffer = []
+
+    def flush(self):
+        # Row groups are written once full; tiny groups would defeat the encoding.
+        pass
+
+    def close(self):
+        self._write_row_group()
+        self._writer.close()
+
+
+class SqliteSink:
+    def __init__(self, path, output_cfg, table=RESULTS_TABLE):
+        self.table = table
+        self.names = [name for name, _ in table["columns"]]
+        self._conn = sqlite3.connect(path)
+        columns = ", ".join(f"{name} {SQLITE_TYPES[kind]}" for name, kind in table["columns"])
+        with self._conn:
+            self._conn.execute(f"DROP TABLE IF EXISTS {table['name']}")
+            self._conn.execute(f"CREATE TABLE {table['name']} ({columns})")
+        self._insert = (
+            f"INSERT INTO {table['name']} ({', '.join(self.names)}) "
+            f"VALUES ({', '.join('?' for _ in self.names)})"
+        )
+        self._buffer = []
+
+    def write(self, record):
+        self._buffer.append([record.get(name) for name in self.names])
+
+    def flush(self):
+        if self._buffer:
+            with self._conn:
+                self._conn.executemany(self._insert, self._buffer)
+            self._buffer = []
+
+    def close(self):
+        self.flush()
+        # Indexes are built once after the bulk load, which is faster than
+        # maintaining them on every insert.
+        with self._conn:
+            for name, columns in self.table["indexes"].items():
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {name} ON {self.table['name']} ({', '.join(columns)})"
+                )
+        self._conn.close()
+
+
+OUTPUT_SINKS = {
+    "csv": CsvSink,
+    "parquet": ParquetSink,
+    "sqlite": SqliteSink,
+}
+
+
+class NormalizedSink:
+    # Writes each (language, page) once to the pages table and every query as a
+    # (page_id, query) edge, instead of repeating page metrics per query row.
+
+    def __init__(self, path, output_format, output_cfg, extra_columns=()):
+        sink_class = OUTPUT_SINKS[output_format]
+        self.extra_columns = list(extra_columns)
+        self.pages = sink_class(path, output_cfg, PAGES_TABLE)
+        self.page_queries = sink_class(
+            get_page_queries_path(path),
+            output_cfg,
+            extend_table(PAGE_QUERIES_TABLE, self.extra_columns),
+        )
+        self._page_ids = {}
+
+    def write(self, record):
+        key = (record["language"], record["source_page"])
+        page_id = self._page_ids.get(key)
+        if page_id is None:
+            page_id = self._page_ids[key] = len(self._page_ids) + 1
+            self.pages.write(
+                {
+                    "page_id": page_id,
+                    "mode": record["mode"],
+                    "language": record["language"],
+                    "id": record["id"],
+                    "country": record["country"],
+                    "city": record["city"],
+                    "page": record["source_page"],
+                    "clicks": record["clicks"],
+                    "impressions": record["impressions"],
+                    "ctr": record["ctr"],
+                    "position": record["position"],
+                }
+            )
+        edge = {
+            "page_id": page_id,
+            "query": record["query"],
+            "clicks": record.get("query_clicks"),
+            "impressions": record.get("query_impressions"),
+            "ctr": record.get("query_ctr"),
+            "position": record.get("query_position"),
+        }
+        for name in self.extra_columns:
+            edge[name] = record.get(name)
+        self.page_queries.write(edge)
+
+    def flush(self):
+        self.pages.flush()
+        self.page_queries.flush()
+
+    def close(self):
+        self.pages.close()
+        self.page_queries.close()
+
+
+def open_output_sink(path, output_format, output_cfg, layout="flat", extra_columns=()):
+    # extra_columns are optional per-query text columns appended to the flat
+    # results table or to the normalized page_queries table.
+    if output_format == "sqlite" and os.path.exists(path):
+        os.remove(path)
+    if layout == "normalized":
+        return NormalizedSink(path, output_format, output_cfg, extra_columns)
+    return OUTPUT_SINKS[output_format](path, output_cfg, extend_table(RESULTS_TABLE, extra_columns))
+
+
+def get_coverage_path(output_path):
+    # Coverage is a small side table, so it is always written as CSV next to
+    # the output it describes.
+    base, _ = os.path.splitext(output_path)
+    if base.endswith(PAGES_SUFFIX):
+        base = base[: -len(PAGES_SUFFIX)]
+    return f"{base}{COVERAGE_SUFFIX}.csv"
+
+
+def write_coverage(output_path, coverage, output_cfg):
+    path = get_coverage_path(output_path)
+    sink = CsvSink(path, output_cfg, COVERAGE_TABLE)
+    try:
+        for entry in coverage:
+            sink.write(entry)
+    finally:
+        sink.close()
+    return path
+
+
+def _as_text(value):
+    if value is None:
+        return ""
+    return str(value)
+
+
+class OutputReader:
+    # Reads one collector output table back as string-valued dicts, like csv.DictReader.
+
+    def __init__(self, path, table=RESULTS_TABLE, encoding="utf-8", delimiter=","):
+        self.path = str(path)
+        self.format = detect_output_format(self.path)
+        self._handle = None
+        self._conn = None
+
+        if self.format == "parquet":
+            require_pyarrow()
+            self._parquet = pq.ParquetFile(self.path)
+            self.fieldnames = list(self._parquet.schema_arrow.names)
+        elif self.format == "sqlite":
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._cursor = self._conn.execute(f"SELECT * FROM {table['name']} ORDER BY rowid")
+            self.fieldnames = [column[0] for column in self._cursor.description]
+        else:
+            self._handle = open(self.path, "r", encoding=encoding, newline="")
+            self._reader = csv.DictReader(self._handle, delimiter=delimiter)
+            self.fieldnames = self._reader.fieldnames
+
+    def __iter__(self):
+        if self.format == "parquet":
+            for batch in self._parquet.iter_batches():
+                for record in batch.to_pylist():
+                    yield {key: _as_text(value) for key, value in record.items()}
+        elif self.format == "sqlite":
+            for values in self._cursor:
+                yield dict(zip(self.fieldnames, (_as_text(value) for value in values)))
+        else:
+            yield from self._reader
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+        if self._conn is not None:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_normalized_pages(pages_path):
+    # Yields (page row, [query edge rows]) in page order. Edges are written
+    # grouped by page, so only one page's queries are held at a time.
+    with OutputReader(pages_path, PAGES_TABLE) as pages, OutputReader(
+        get_page_queries_path(pages_path), PAGE_QUERIES_TABLE
+    ) as page_queries:
+        edges = iter(page_queries)
+        pending = next(edges, None)
+        for page in pages:
+            page_edges = []
+            while pending is not None and pending["page_id"] == page["page_id"]:
+                page_edges.append(pending)
+                pending = next(edges, None)
+            yield page, page_edges
+
+
+def iter_flat_rows(path):
+    # Flat (results-shaped) rows for either layout; normalized page metrics are
+    # repeated onto each query row the way the flat page_wise output has them.
+    if not is_normalized_output(path):
+        with OutputReader(path) as reader:
+            yield from reader
+        return
+
+    edge_columns = {name for name, _ in PAGE_QUERIES_TABLE["columns"]}
+    for page, page_edges in iter_normalized_pages(path):
+        for edge in page_edges:
+            extras = {key: value for key, value in edge.items() if key not in edge_columns}
+            yield {
+                "mode": page["mode"],
+                "language": page["language"],
+                "id": page["id"],
+                "country": page["country"],
+                "city": page["city"],
+                "source_query": "",
+                "source_page": page["page"],
+                "query": edge["query"],
+                "clicks": page["clicks"],
+                "impressions": page["impressions"],
+                "ctr": page["ctr"],
+                "position": page["position"],
+                **extras,
+            }
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+import csv
+import io
+import math
+import os
+import threading
+from array import array
+from collections import OrderedDict
+
+from output_sinks import detect_output_format, is_normalized_output, iter_flat_rows
+
+
+METRIC_COLUMNS = ("clicks", "impressions", "ctr", "position")
+MAX_CACHED_INDEXES = 4
+MAX_CACHED_VIEWS = 32
+MAX_PAGE_SIZE = 1000
+
+
+def preview_row(row):
+    return {
+        "query": (row.get("query") or "").strip(),
+        "page": (row.get("source_page") or row.get("page") or "").strip(),
+        "language": (row.get("language") or "").strip(),
+        "clicks": row.get("clicks", ""),
+        "impressions": row.get("impressions", ""),
+        "ctr": row.get("ctr", ""),
+        "position": row.get("position", ""),
+    }
+
+
+def _metric(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _read_record(handle):
+    # One CSV record as bytes; a quoted field may span several lines, so lines
+    # are joined until the quotes balance.
+    record = handle.readline()
+    while record and record.count(b'"') % 2:
+        line = handle.readline()
+        if not line:
+            break
+        record += line
+    return record
+
+
+class PreviewIndex:
+    # Random access to one collector output for the dashboard preview. Flat CSV
+    # rows are read back by byte offset; other formats and the normalized layout
+    # keep their preview rows in memory. Metric values live in arrays, so each
+    # sort is a permutation computed once, and substring filters scan one
+    # casefolded text per row.
+
+    def __init__(self, path):
+        self.path = str(path)
+        stat = os.stat(self.path)
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        self.offsets = None
+        self.rows = None
+        self.metrics = {column: array("d") for column in METRIC_COLUMNS}
+        self.search_text = []
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+        if detect_output_format(self.path) == "csv" and not is_normalized_output(self.path):
+            self._build_from_csv()
+        if self.offsets is None or len(self.offsets) != len(self):
+            # Not a plain CSV, or one whose records could not be located by offset.
+            self.offsets = None
+            self.metrics = {column: array("d") for column in METRIC_COLUMNS}
+            self.search_text = []
+            self._build_from_rows()
+
+    def __len__(self):
+        return len(self.search_text)
+
+    def _add(self, row):
+        for column in METRIC_COLUMNS:
+            self.metrics[column].append(_metric(row[column]))
+        self.search_text.append(f"{row['query']}\n{row['page']}".casefold())
+
+    def _build_from_csv(self):
+        self.offsets = array("q")
+        with open(self.path, "rb") as handle:
+            _read_record(handle)
+            while True:
+                offset = handle.tell()
+                record = _read_record(handle)
+                if not record:
+                    break
+                # csv.DictReader skips blank lines as well, so offsets stay aligned.
+                if record.rstrip(b"\r\n"):
+                    self.offsets.append(offset)
+
+        with open(self.path, "r", encoding="utf-8-sig", newline="") as handle:
+            reader = csv.DictReader(handle)
+            self.fieldnames = reader.fieldnames
+            for row in reader:
+                self._add(preview_row(row))
+
+    def _build_from_rows(self):
+        self.rows = []
+        for row in iter_flat_rows(self.path):
+            row = preview_row(row)
+            self.rows.append(row)
+            self._add(row)
+
+    def _read_rows(self, positions):
+        if self.rows is not None:
+            return [self.rows[position] for position in positions]
+
+        rows = []
+        with open(self.path, "rb") as handle:
+            for position in positions:
+                handle.seek(self.offsets[position])
+                text = _read_record(handle).decode("utf-8")
+                values = next(csv.reader(io.StringIO(text)), [])
+                rows.append(preview_row(dict(zip(self.fieldnames, values))))
+        return rows
+
+    def _view(self, sort, order, query):
+        # Row positions in display order for one (sort, order, filter); cached.
+        key = (sort, order, query)
+        with self._lock:
+            if key in self._views:
+                self._views.move_to_end(key)
+                return self._views[key]
+
+        if query:
+            # Filters reuse the cached unfiltered order of the same sort.
+            needle = query.casefold()
+            search_text = self.search_text
+            positions = [
+                position
+                for position in self._view(sort, order, "")
+                if needle in search_text[position]
+            ]
+        elif sort in METRIC_COLUMNS:
+            values = self.metrics[sort]
+            # Rows without a value sort last in both directions; sorted() stays
+            # stable with reverse=True, so ties keep file order.
+            missing = [position for position, value in enumerate(values) if value != value]
+            present = [position for position, value in enumerate(values) if value == value]
+            positions = sorted(present, key=values.__getitem__, reverse=order == "descending")
+            positions.extend(missing)
+        else:
+            positions = range(len(self))
+        positions = array("I", positions)
+
+        with self._lock:
+            self._views[key] = positions
+            while len(self._views) > MAX_CACHED_VIEWS:
+                self._views.popitem(last=False)
+        return positions
+
+    def page(self, page=1, page_size=100, sort=None, order="descending", query=""):
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        positions = self._view(sort, order, query)
+        total = len(positions)
+        pages = max(1, math.ceil(total / page_size))
+        page = max(1, min(int(page), pages))
+        start = (page - 1) * page_size
+        return {
+            "rows": self._read_rows(positions[start : start + page_size]),
+            "total": total,
+            "total_rows": len(self),
+            "page": page,
+            "page_size": page_size,
+            "pages": pages,
+        }
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_preview_index(path):
+    # Indexes are reused while the file's mtime and size are unchanged.
+    path = str(path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is not None and index.signature == signature:
+            _indexes.move_to_end(path)
+            return index
+
+    index = PreviewIndex(path)
+    with _indexes_lock:
+        _indexes[path] = index
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
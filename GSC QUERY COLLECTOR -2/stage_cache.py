@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from city_index import file_sha256
+
+
+MAX_ENTRIES_PER_STAGE = 20
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def config_hash(config):
+    canonical = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def stage_key(stage, inputs):
+    return config_hash({"stage": stage, "inputs": inputs})
+
+
+class StageCache:
+    # Remembers, per pipeline stage, the hash of the inputs it last ran with and
+    # the content hashes of the files it produced. A stage can be skipped when
+    # its inputs hash matches and those files are still on disk unchanged;
+    # lookup(max_age_seconds=...) also refuses entries stored longer ago.
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _save(self, data):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            print(f"[WARNING] Could not write stage cache {self.path}: {exc}")
+
+    def lookup(self, stage, key, max_age_seconds=None):
+        with self._lock:
+            entry = (self._load().get(stage) or {}).get(key)
+        if not isinstance(entry, dict):
+            return None
+        if max_age_seconds is not None and time.time() - entry.get("stored_at", 0) > max_age_seconds:
+            return None
+        artifacts = entry.get("artifacts") or {}
+        if not artifacts:
+            return None
+        for path, digest in artifacts.items():
+            if not os.path.isfile(path) or file_sha256(path) != digest:
+                return None
+        return entry
+
+    def store(self, stage, key, artifact_paths, result):
+        entry = {
+            "artifacts": {str(path): file_sha256(path) for path in artifact_paths},
+            "result": result,
+            "stored_at": time.time(),
+        }
+        with self._lock:
+            data = self._load()
+            entries = data.setdefault(stage, {})
+            entries[key] = entry
+            for old_key in sorted(entries, key=lambda k: entries[k].get("stored_at", 0))[
+                : max(0, len(entries) - MAX_ENTRIES_PER_STAGE)
+            ]:
+                del entries[old_key]
+            self._save(data)
+        return entry